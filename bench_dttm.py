@@ -0,0 +1,406 @@
+#!/usr/bin/python
+
+'''
+A reproducible benchmark suite for the DTTM library.
+
+Synthetic corpora modelled on the bundled dates file are generated from a fixed seed, and every public
+function is timed against each of them.  For every (corpus, function) pair the suite reports throughput
+(rows per second), per-call latency percentiles, and the peak memory of the process that ran it.  Each
+case runs in its own process, so parse caches start empty and memory peaks aren't shared between cases.
+
+Corpora
+---------
+
+	iso: clean ISO values like the dates file ("2013-02-24 18:15:44")
+	mixed: a mix of ISO, slash and month name formats
+	fuzzy: free text ("Today is 25 of September of 2003, exactly at 10:49:41")
+	repeated: ISO values drawn from a small pool, like a log feed repeating the same second
+	unique: ISO values with microseconds, where no two rows are the same
+
+Usage
+---------
+
+	python bench_dttm.py
+	python bench_dttm.py --rows 10000,1000000 --corpus iso,mixed --function parse_temporal,date_trunc
+	python bench_dttm.py --json results.json
+	python bench_dttm.py --baseline results.json --tolerance 0.15
+
+When a baseline is given, each case is compared with the same case in the baseline, and the exit status
+is 1 if any of them got slower by more than the tolerance.
+
+The suite also times how long importing dttm takes in a fresh interpreter (the 'startup' case), since 
+Pig imports the script again in every task.
+
+'''
+
+import json
+import multiprocessing
+import optparse
+import os
+import random
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dttm
+
+CORPORA = ['iso', 'mixed', 'fuzzy', 'repeated', 'unique']
+
+MIXED_FORMATS = [
+	'%Y-%m-%d %H:%M:%S',
+	'%Y-%m-%dT%H:%M:%S.%f',
+	'%m/%d/%Y %H:%M',
+	'%d/%m/%Y',
+	'%B %d, %Y %I:%M %p',
+	'%d %b %Y %H:%M:%S',
+]
+
+FUZZY_FORMATS = [
+	'Today is %d of %B of %Y, exactly at %H:%M:%S',
+	'logged on %A %B %d %Y at %H:%M',
+	'%B %dth in %Y',
+	'event at %H:%M:%S on %d %b %Y (local)',
+]
+
+# the number of distinct values in the 'repeated' corpus
+REPEATED_POOL = 500
+
+def generate_corpus(kind, rows, seed=2013):
+	'''
+	Returns a list of rows temporal strings of the given kind, the same every time for the same seed.
+	'''
+	rng = random.Random('%s-%d' % (kind, seed))
+	start = datetime(2013, 2, 24, 18, 15, 44)
+
+	def random_datetime():
+		return start - timedelta(seconds=rng.randint(0, 20 * 365 * 86400))
+
+	if kind == 'iso':
+		return [str(random_datetime()) for i in xrange(rows)]
+	elif kind == 'mixed':
+		return [random_datetime().strftime(rng.choice(MIXED_FORMATS)) for i in xrange(rows)]
+	elif kind == 'fuzzy':
+		return [random_datetime().strftime(rng.choice(FUZZY_FORMATS)) for i in xrange(rows)]
+	elif kind == 'repeated':
+		pool = [str(random_datetime()) for i in xrange(REPEATED_POOL)]
+		return [pool[min(int(rng.expovariate(0.05)), REPEATED_POOL - 1)] for i in xrange(rows)]
+	elif kind == 'unique':
+		return [str(start - timedelta(microseconds=i * 1000003)) for i in xrange(rows)]
+	else:
+		raise ValueError("unknown corpus '%s'" % (kind,))
+
+def _extractor(name):
+	function = getattr(dttm, name)
+	return lambda values: [function(value) for value in values]
+
+def _manipulation(name, date_part, *arguments):
+	function = getattr(dttm, name)
+	return lambda values: [function(*((date_part,) + arguments + (value,))) for value in values]
+
+def _date_diff(date_part):
+	def run(values):
+		previous = values[-1]
+		result = []
+
+		for value in values:
+			result.append(dttm.date_diff(date_part, previous, value))
+			previous = value
+
+		return result
+
+	return run
+
+# every benchmarked function, as a callable taking the whole corpus and returning one result per row
+FUNCTIONS = [
+	('parse_temporal', _extractor('parse_temporal')),
+	('date_name:year', _manipulation('date_name', 'year')),
+	('date_name:day_name', _manipulation('date_name', 'day_name')),
+	('date_name:isoww', _manipulation('date_name', 'isoww')),
+	('date_parts:yy,mm,dd,hh', _manipulation('date_parts', 'yy,mm,dd,hh')),
+	('date_diff:day', _date_diff('day')),
+	('date_diff:month', _date_diff('month')),
+	('date_diff:second', _date_diff('second')),
+	('date_add:second', _manipulation('date_add', 'second', 1)),
+	('date_add:day', _manipulation('date_add', 'day', 1)),
+	('date_add:month', _manipulation('date_add', 'month', 1)),
+	('date_add:year', _manipulation('date_add', 'year', -1)),
+	('date_trunc:day', _manipulation('date_trunc', 'day')),
+	('date_trunc:quarter', _manipulation('date_trunc', 'quarter')),
+	('date_start_of:month', _manipulation('date_start_of', 'month')),
+	('date_end_of:month', _manipulation('date_end_of', 'month')),
+	('date_end_of:year', _manipulation('date_end_of', 'year')),
+	('year', _extractor('year')),
+	('quarter', _extractor('quarter')),
+	('month', _extractor('month')),
+	('day_of_year', _extractor('day_of_year')),
+	('day', _extractor('day')),
+	('week', _extractor('week')),
+	('iso_week', _extractor('iso_week')),
+	('day_name', _extractor('day_name')),
+	('day_of_week', _extractor('day_of_week')),
+	('hour', _extractor('hour')),
+	('minute', _extractor('minute')),
+	('second', _extractor('second')),
+	('microsecond', _extractor('microsecond')),
+	('tz_offset', _extractor('tz_offset')),
+	('epoch', _extractor('epoch')),
+]
+
+def _percentile(ordered, fraction):
+	if not ordered:
+		return 0.0
+	return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _peak_memory_kb():
+	if resource is None:
+		return None
+
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+	# ru_maxrss is in bytes on Mac OS X and kilobytes everywhere else
+	if sys.platform == 'darwin':
+		peak //= 1024
+
+	return peak
+
+def run_case(corpus, rows, name, latency_samples, seed):
+	'''
+	Times one function over one corpus, returning a dictionary with the measurements.
+	'''
+	function = dict(FUNCTIONS)[name]
+	values = generate_corpus(corpus, rows, seed)
+	dttm.parse_cache_clear()
+
+	timer = timeit.default_timer
+	start = timer()
+	function(values)
+	elapsed = timer() - start
+
+	# time individual calls separately on a sample, with a fresh cache, so that timing each call
+	# doesn't distort the throughput figure
+	dttm.parse_cache_clear()
+	latencies = []
+
+	for value in values[:latency_samples]:
+		call_start = timer()
+		function([value])
+		latencies.append(timer() - call_start)
+
+	latencies.sort()
+
+	return {
+		'corpus': corpus,
+		'rows': rows,
+		'function': name,
+		'seconds': elapsed,
+		'rows_per_second': rows / elapsed if elapsed else None,
+		'latency_us': {
+			'p50': _percentile(latencies, 0.50) * 1e6,
+			'p90': _percentile(latencies, 0.90) * 1e6,
+			'p99': _percentile(latencies, 0.99) * 1e6,
+			'max': latencies[-1] * 1e6 if latencies else 0.0,
+		},
+		'peak_memory_kb': _peak_memory_kb(),
+	}
+
+def run_startup(runs):
+	'''
+	Times importing dttm in fresh interpreters, less the time that starting an interpreter takes by itself,
+	returning a dictionary with the measurements like run_case() does.  Throughput is imports per second.
+	'''
+	directory = os.path.dirname(os.path.abspath(__file__))
+	timer = timeit.default_timer
+
+	def time_interpreter(code):
+		start = timer()
+		subprocess.check_call([sys.executable, '-c', code], cwd=directory)
+		return timer() - start
+
+	# the first import compiles the module, which Pig and Python only do once
+	time_interpreter('import dttm')
+
+	empty = sorted(time_interpreter('pass') for i in xrange(runs))
+	imports = sorted(time_interpreter('import dttm') for i in xrange(runs))
+	latencies = sorted(max(0.0, importing - _percentile(empty, 0.50)) for importing in imports)
+	elapsed = _percentile(latencies, 0.50)
+
+	return {
+		'corpus': 'startup',
+		'rows': runs,
+		'function': 'import dttm',
+		'seconds': elapsed,
+		'rows_per_second': 1.0 / elapsed if elapsed else None,
+		'latency_us': {
+			'p50': _percentile(latencies, 0.50) * 1e6,
+			'p90': _percentile(latencies, 0.90) * 1e6,
+			'p99': _percentile(latencies, 0.99) * 1e6,
+			'max': latencies[-1] * 1e6 if latencies else 0.0,
+		},
+		'peak_memory_kb': None,
+	}
+
+def _run_case_in_child(connection, arguments):
+	try:
+		connection.send(run_case(*arguments))
+	except Exception, error:
+		connection.send({'error': '%s: %s' % (type(error).__name__, error)})
+	connection.close()
+
+def run_isolated(corpus, rows, name, latency_samples, seed):
+	'''
+	Runs one case in a separate process, so that its cache and peak memory are its own.
+	'''
+	parent, child = multiprocessing.Pipe(duplex=False)
+	process = multiprocessing.Process(target=_run_case_in_child,
+		args=(child, (corpus, rows, name, latency_samples, seed)))
+	process.start()
+	result = parent.recv()
+	process.join()
+
+	if 'error' in result:
+		result.update({'corpus': corpus, 'rows': rows, 'function': name})
+
+	return result
+
+def compare(results, baseline):
+	'''
+	Returns a list of (result, baseline result, ratio) for the cases that are in both, where ratio is the
+	current throughput over the baseline throughput.
+	'''
+	previous = dict(((r['corpus'], r['rows'], r['function']), r) for r in baseline.get('results', []))
+	comparisons = []
+
+	for result in results:
+		before = previous.get((result['corpus'], result['rows'], result['function']))
+
+		if before is None or not before.get('rows_per_second') or not result.get('rows_per_second'):
+			continue
+
+		comparisons.append((result, before, result['rows_per_second'] / before['rows_per_second']))
+
+	return comparisons
+
+def main(argv=None):
+	option_parser = optparse.OptionParser(usage='%prog [options]',
+		description='Benchmark the DTTM functions over synthetic temporal corpora.')
+	option_parser.add_option('--rows', default='10000',
+		help='comma separated corpus sizes (default 10000), for example 10000,1000000,10000000')
+	option_parser.add_option('--corpus', default=','.join(CORPORA),
+		help='comma separated corpora to use (default all: %s)' % ','.join(CORPORA))
+	option_parser.add_option('--function', default='',
+		help='comma separated functions to benchmark (default all)')
+	option_parser.add_option('--latency-samples', type='int', default=2000,
+		help='the number of calls timed individually for latency percentiles (default 2000)')
+	option_parser.add_option('--seed', type='int', default=2013,
+		help='the seed for generating the corpora (default 2013)')
+	option_parser.add_option('--json', dest='json_path',
+		help='write the results to this file as JSON')
+	option_parser.add_option('--baseline',
+		help='compare against results previously written with --json')
+	option_parser.add_option('--tolerance', type='float', default=0.10,
+		help='the fraction of throughput a case may lose against the baseline (default 0.10)')
+	option_parser.add_option('--startup-runs', type='int', default=20,
+		help='the number of interpreters started to time importing dttm (default 20, 0 to skip)')
+	option_parser.add_option('--in-process', action='store_true', default=False,
+		help="run every case in this process (faster, but peak memory isn't per case)")
+	option_parser.add_option('--list', action='store_true', default=False,
+		help='list the functions that can be benchmarked')
+
+	options, arguments = option_parser.parse_args(argv)
+
+	if options.list:
+		for name, function in FUNCTIONS:
+			print name
+		return 0
+
+	names = [name for name, function in FUNCTIONS]
+	selected = [n.strip() for n in options.function.split(',') if n.strip()] or names
+	corpora = [c.strip() for c in options.corpus.split(',') if c.strip()]
+	sizes = [int(r) for r in options.rows.split(',') if r.strip()]
+
+	for name in selected:
+		if name not in names:
+			option_parser.error("unknown function '%s' (see --list)" % name)
+
+	for corpus in corpora:
+		if corpus not in CORPORA:
+			option_parser.error("unknown corpus '%s'" % corpus)
+
+	run = run_case if options.in_process else run_isolated
+	results = []
+
+	print '%-10s %10s %-24s %14s %10s %10s %10s %12s' % (
+		'corpus', 'rows', 'function', 'rows/s', 'p50 us', 'p90 us', 'p99 us', 'peak KB')
+
+	if options.startup_runs > 0:
+		result = run_startup(options.startup_runs)
+		results.append(result)
+
+		print '%-10s %10d %-24s %14.1f %10.1f %10.1f %10.1f %12s' % (
+			result['corpus'], result['rows'], result['function'], result['rows_per_second'] or 0.0,
+			result['latency_us']['p50'], result['latency_us']['p90'], result['latency_us']['p99'], '')
+		sys.stdout.flush()
+
+	for rows in sizes:
+		for corpus in corpora:
+			for name in selected:
+				result = run(corpus, rows, name, options.latency_samples, options.seed)
+				results.append(result)
+
+				if 'error' in result:
+					print '%-10s %10d %-24s %s' % (corpus, rows, name, result['error'])
+					continue
+
+				print '%-10s %10d %-24s %14.0f %10.1f %10.1f %10.1f %12s' % (
+					corpus, rows, name, result['rows_per_second'], result['latency_us']['p50'],
+					result['latency_us']['p90'], result['latency_us']['p99'], result['peak_memory_kb'])
+				sys.stdout.flush()
+
+	report = {
+		'python': sys.version.split()[0],
+		'platform': sys.platform,
+		'seed': options.seed,
+		'results': results,
+	}
+
+	if options.json_path:
+		output = open(options.json_path, 'w')
+		try:
+			json.dump(report, output, indent=2, sort_keys=True)
+		finally:
+			output.close()
+
+	status = 0
+
+	if options.baseline:
+		baseline_file = open(options.baseline)
+		try:
+			baseline = json.load(baseline_file)
+		finally:
+			baseline_file.close()
+
+		print
+		print '%-10s %10s %-24s %14s %14s %8s' % ('corpus', 'rows', 'function', 'baseline/s', 'current/s', 'ratio')
+
+		for result, before, ratio in compare(results, baseline):
+			flag = ''
+
+			if ratio < 1.0 - options.tolerance:
+				flag = ' SLOWER'
+				status = 1
+
+			print '%-10s %10d %-24s %14.0f %14.0f %8.2f%s' % (result['corpus'], result['rows'], result['function'],
+				before['rows_per_second'], result['rows_per_second'], ratio, flag)
+
+	return status
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -86,22 +86,495 @@ the totally awesome Python dateutil library and parser.  A temporal value could
 
 (4) As mentioned before, this library depends on the python datetime and dateutil libraries.  They must be installed
 and available in your Jython Path across your cluster.
+
+(5) DTTM needs Python 2.7: Jython 2.7 in Pig, or CPython 2.7 for the command line and the batch functions.  It 
+uses int.bit_length(), bytearray, mmap and json, none of which Jython 2.5 has, so importing it there fails 
+straight away rather than part way through a job.
 			
 '''
-import datetime
-from datetime import *
+from datetime import datetime, date, timedelta
 
+import bisect
 import time
+import os
+import re
+import sys
+
+if sys.version_info < (2, 7):
+	raise ImportError('dttm needs Python 2.7 or later (Jython 2.7 under Pig), not %d.%d' % sys.version_info[:2])
+
+class _LazyModule(object):
+	'''
+	Stands in for a module that isn't imported until one of its attributes is first used.  Pig imports 
+	this file again in every task, and most tasks never need the fuzzy parser, time zones or recurrence 
+	rules, so those parts of dateutil are only loaded by the tasks that use them.
+	'''
+
+	def __init__(self, name):
+		self._name = name
+
+	def __getattr__(self, attribute):
+		if attribute.startswith('__'):
+			# don't import the module for introspection (copy, pickle, hasattr(x, '__call__'), ...)
+			raise AttributeError(attribute)
+
+		module = __import__(self._name, globals(), locals(), [attribute])
+		value = getattr(module, attribute)
+
+		# later lookups find the attribute directly and never come back here
+		setattr(self, attribute, value)
+		return value
+
+parser = _LazyModule('dateutil.parser')
+rrule = _LazyModule('dateutil.rrule')
+tz = _LazyModule('dateutil.tz')
+
+# numpy is only needed by the batch (*_many) functions, and isn't available under Jython, so it is
+# imported by the first of them to be called (see _require_numpy())
+numpy = None
+
+try:
+	outputSchema
+except NameError:
+	# Pig provides the outputSchema decorator when it registers this file, so outside of Pig (in plain
+	# Python, to use the batch functions or run it from the command line) a stand-in records the schema.
+	def outputSchema(schema):
+		def decorator(func):
+			func.outputSchema = schema
+			return func
+		return decorator
+
+# Every name and abbreviation that can be passed as a date_part, and the unit that it stands for.
+_DATE_PARTS = {
+	'year': 'year', 'yy': 'year', 'yyyy': 'year',
+	'quarter': 'quarter', 'qq': 'quarter', 'q': 'quarter',
+	'month': 'month', 'mm': 'month', 'm': 'month',
+	'day_of_year': 'day_of_year', 'dy': 'day_of_year', 'y': 'day_of_year',
+	'day_name': 'day_name', 'dn': 'day_name',
+	'day': 'day', 'dd': 'day', 'd': 'day',
+	'week': 'week', 'wk': 'week', 'ww': 'week',
+	'weekday': 'weekday', 'dw': 'weekday',
+	'day_of_week': 'day_of_week', 'dow': 'day_of_week',
+	'hour': 'hour', 'hh': 'hour',
+	'minute': 'minute', 'mi': 'minute', 'n': 'minute',
+	'second': 'second', 'ss': 'second', 's': 'second',
+	'microsecond': 'microsecond', 'mcs': 'microsecond',
+	'epoch': 'epoch', 'unix': 'epoch', 'ep': 'epoch',
+	'TZoffset': 'tz_offset', 'tz': 'tz_offset',
+	'ISO_WEEK': 'iso_week', 'iso_wk': 'iso_week', 'isoww': 'iso_week',
+	'business_day': 'business_day', 'bday': 'business_day', 'bd': 'business_day',
+}
+
+# The number of distinct temporal strings remembered by parse_temporal().  This can be set
+# per task through the environment, or changed at runtime with parse_cache_resize().
+PARSE_CACHE_SIZE = int(os.environ.get('DTTM_PARSE_CACHE_SIZE', 4096))
+
+class TemporalCache(object):
+	'''
+	A size-bounded cache of parsed temporal values, keyed by the text that was parsed.  When the
+	cache is full, the least recently used entry is evicted to make room for the new one.
+
+	Log feeds tend to repeat the same second-resolution timestamp many times in a row, so
+	remembering recent results turns most calls to parse_temporal() into a dictionary lookup.
+	Values that can't be parsed are cached too (along with the error), since dirty feeds repeat 
+	their bad values as well.  Datetime values are immutable, so they can be safely handed out 
+	more than once.
+
+	Usage:
+
+		cache = TemporalCache(1000)
+		cache.put('2013-02-24 18:15:44', datetime(2013,2,24,18,15,44))
+		cache.get('2013-02-24 18:15:44')
+		cache.stats()
+
+	Parameters:
+
+		capacity: the maximum number of entries to hold.  A capacity of 0 disables caching.
+
+	'''
+
+	def __init__(self, capacity=PARSE_CACHE_SIZE):
+		self.capacity = max(0, int(capacity))
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._map = {}
+
+		# a circular doubly linked list of [prev, next, key, value] links, the oldest entry follows the root
+		self._root = []
+		self._root[:] = [self._root, self._root, None, None]
+
+	def __len__(self):
+		return len(self._map)
+
+	def get(self, key, default=None):
+		'''
+		Returns the value cached for key (marking it as the most recently used) or default if it is not cached.
+		'''
+		link = self._map.get(key)
+
+		if link is None:
+			self.misses += 1
+			return default
+
+		self.hits += 1
+
+		# unlink the entry and move it to the most recently used end
+		link_prev, link_next = link[0], link[1]
+		link_prev[1] = link_next
+		link_next[0] = link_prev
+
+		root = self._root
+		last = root[0]
+		last[1] = root[0] = link
+		link[0] = last
+		link[1] = root
+
+		return link[3]
+
+	def put(self, key, value):
+		'''
+		Stores value for key, evicting the least recently used entry if the cache is full.
+		'''
+		if self.capacity == 0:
+			return
+
+		link = self._map.get(key)
+
+		if link is not None:
+			link[3] = value
+			return
+
+		if len(self._map) >= self.capacity:
+			self._evict()
+
+		root = self._root
+		last = root[0]
+		link = [last, root, key, value]
+		last[1] = root[0] = self._map[key] = link
+
+	def clear(self):
+		'''
+		Removes all of the entries and resets the counters.
+		'''
+		self._map.clear()
+		self._root[:] = [self._root, self._root, None, None]
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def resize(self, capacity):
+		'''
+		Changes the capacity of the cache, evicting the least recently used entries if it shrinks.
+		'''
+		self.capacity = max(0, int(capacity))
+
+		while len(self._map) > self.capacity:
+			self._evict()
+
+	def stats(self):
+		'''
+		Returns a dictionary with the hits, misses, evictions, size, and capacity of the cache.
+		'''
+		return {
+			'hits': self.hits,
+			'misses': self.misses,
+			'evictions': self.evictions,
+			'size': len(self._map),
+			'capacity': self.capacity,
+		}
+
+	def _evict(self):
+		root = self._root
+		oldest = root[1]
+		oldest_next = oldest[1]
+		root[1] = oldest_next
+		oldest_next[0] = root
+		del self._map[oldest[2]]
+		self.evictions += 1
+
+_parse_cache = TemporalCache(PARSE_CACHE_SIZE)
+
+def parse_cache_stats():
+	'''
+	Returns a dictionary with the hits, misses, evictions, size, and capacity of the cache used by parse_temporal().
+	'''
+	return _parse_cache.stats()
+
+def parse_cache_clear():
+	'''
+	Empties the cache used by parse_temporal() and resets its counters.
+	'''
+	_parse_cache.clear()
+
+def parse_cache_resize(capacity):
+	'''
+	Changes the number of entries the cache used by parse_temporal() can hold.  A capacity of 0 disables caching.
+	'''
+	_parse_cache.resize(capacity)
+
+# What parse_temporal() and the other functions do with a value that can't be parsed: 'raise' an
+# exception, return 'null' (None), or 'quarantine' it, which returns None and keeps the value aside for
+# a look later.  This can be set per task through the environment, or changed with set_error_policy().
+_ERROR_POLICIES = ('raise', 'null', 'quarantine')
+ERROR_POLICY = os.environ.get('DTTM_ERRORS', 'raise')
+
+# The number of rejected values a Quarantine keeps in memory (all of them are counted, and written to
+# the reject file if there is one).
+QUARANTINE_SIZE = int(os.environ.get('DTTM_QUARANTINE_SIZE', 1000))
+
+class Quarantine(object):
+	'''
+	A side channel for the values that couldn't be parsed under the 'quarantine' error policy.  The 
+	first capacity rejects are kept in memory as (row, value, error) tuples, so a dirty feed can't use
+	up the memory of the task, and every reject is counted.  If a path is given, every reject is also 
+	appended to it as a tab delimited line of the row, the value, and the error.
+
+	The row is the position of the value in a batch (parse_temporal_many(), parse_temporal_column()), 
+	or None for single values.
+
+	Usage:
+
+		quarantine = Quarantine(100, 'rejects.tsv')
+		set_error_policy('quarantine', quarantine)
+		...
+		quarantine.records
+		quarantine.close()
+
+	Parameters:
+
+		capacity: the maximum number of rejects to keep in memory.
+		path: a file to append every reject to (optional).
+
+	'''
+
+	def __init__(self, capacity=QUARANTINE_SIZE, path=None):
+		self.capacity = max(0, int(capacity))
+		self.path = path
+		self.count = 0
+		self.records = []
+		self._file = None
+
+	def __len__(self):
+		return self.count
+
+	def add(self, row, value, error):
+		'''
+		Records a value that couldn't be parsed, and the exception it raised.
+		'''
+		self.count += 1
+
+		if len(self.records) < self.capacity:
+			self.records.append((row, value, error))
+
+		if self.path is not None:
+			if self._file is None:
+				self._file = open(self.path, 'a', 1 << 16)
+
+			if row is None:
+				row = ''
+
+			self._file.write('%s\t%s\t%s: %s\n' % (row, _reject_text(value), error.__class__.__name__, 
+				_reject_text(str(error))))
+
+	def clear(self):
+		'''
+		Forgets the rejects kept in memory and resets the count.  Lines already written to the file are kept.
+		'''
+		self.count = 0
+		del self.records[:]
+
+	def close(self):
+		'''
+		Flushes and closes the reject file.  It is opened again (for appending) if there are more rejects.
+		'''
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+	def stats(self):
+		'''
+		Returns a dictionary with the number of rejects, how many of them are kept, the capacity, and the reject file.
+		'''
+		return {'count': self.count, 'kept': len(self.records), 'capacity': self.capacity, 'path': self.path}
+
+def _reject_text(value):
+	'''
+	Returns value as one field of a line in a reject file.
+	'''
+	if isinstance(value, unicode):
+		value = value.encode('utf-8')
+	elif not isinstance(value, str):
+		value = repr(value)
+
+	return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+class _Rejected(object):
+	'''
+	A value that couldn't be parsed, kept in the parse cache in place of a datetime along with the 
+	exception it raised, so that a value that keeps showing up isn't given to the fuzzy parser every time.
+	'''
+	__slots__ = ('error',)
+
+	def __init__(self, error):
+		self.error = error
+
+_error_policy = 'raise'
+_quarantine = Quarantine(QUARANTINE_SIZE, os.environ.get('DTTM_REJECT_FILE') or None)
+
+def set_error_policy(policy, quarantine=None):
+	'''
+	Sets what happens to values that can't be parsed, for parse_temporal(), parse_formatted_temporal(),
+	and every function built on them (year(), date_add(), ...).  In Pig, set the DTTM_ERRORS environment 
+	variable for the tasks instead (and DTTM_REJECT_FILE to write the rejects to a file).
+
+	Usage:
+
+		set_error_policy('null')
+		set_error_policy('quarantine', Quarantine(100, 'rejects.tsv'))
+
+	Parameters:
+
+		policy: 'raise' an exception (the default), return 'null', or 'quarantine' the value and return null.
+		quarantine: the Quarantine to keep the rejects in (optional, keeps the current one if not given).
+
+	Notes:
+
+		Only values that can't be parsed are covered.  Anything else, such as a bad date_part or number,
+		behaves the same whatever the policy is.
+
+	'''
+	global _error_policy, _quarantine
+
+	if policy not in _ERROR_POLICIES:
+		raise ValueError("unknown error policy '%s', expected one of %s" % (policy, ', '.join(_ERROR_POLICIES)))
+
+	if quarantine is not None:
+		_quarantine = quarantine
+
+	_error_policy = policy
+
+set_error_policy(ERROR_POLICY)
+
+def error_policy():
+	'''
+	Returns the current error policy.
+	'''
+	return _error_policy
+
+def error_quarantine():
+	'''
+	Returns the Quarantine that rejected values are kept in.
+	'''
+	return _quarantine
+
+def _reject(value, error, errors, row=None):
+	'''
+	Applies the error policy (errors, or the module's policy if it is None) to a value that couldn't be parsed.
+	A null value is just null under the 'quarantine' policy, rather than something to look at later.
+	'''
+	if errors is None:
+		errors = _error_policy
+
+	if errors == 'null':
+		return None
+
+	if errors == 'quarantine':
+		if value is not None:
+			_quarantine.add(row, value, error)
+		return None
+
+	if errors != 'raise':
+		raise ValueError("unknown error policy '%s', expected one of %s" % (errors, ', '.join(_ERROR_POLICIES)))
+
+	raise error
+
+# Well-formed temporal values are recognized by these patterns and built directly, without going
+# through the fuzzy parser.  Anything they don't match (or that doesn't make a valid datetime) is
+# handed to dateutil, so results are the same either way.
+_ISO_TEMPORAL = re.compile(
+	r'\s*(\d{4})-(\d{1,2})-(\d{1,2})'
+	r'(?:[ T](\d{1,2}):(\d{1,2})(?::(\d{1,2})(?:\.(\d{1,6})\d*)?)?'
+	r'(?:\s*([+-])(\d{2})(?::?(\d{2}))?)?)?\s*$')
+
+_SLASH_TEMPORAL = re.compile(
+	r'\s*(\d{1,4})/(\d{1,2})/(\d{1,4})'
+	r'(?:\s+(\d{1,2}):(\d{1,2})(?::(\d{1,2})(?:\.(\d{1,6})\d*)?)?)?\s*$')
+
+_tzoffsets = {}
+
+def _build_temporal(year, month, day, hour, minute, second, fraction):
+	'''
+	Builds a datetime from the text groups of a fast path match, returning None if it is not a valid datetime.
+	'''
+	try:
+		if hour is None:
+			return datetime(year, month, day)
+
+		return datetime(year, month, day, int(hour), int(minute), int(second or 0), _fraction(fraction))
+	except ValueError:
+		return None
+
+def _scan_temporal(input_text):
+	'''
+	Returns a datetime for ISO 8601 ("1999-12-31 23:59:59", "1999-12-31T23:59:59.123-03:00") and numeric 
+	slash ("12/31/1999 23:59", "31/12/1999", "1999/12/31") temporal values, or None if the text is something 
+	that should be left to the fuzzy parser.
+
+	Offsets of zero and 'Z' are left to the fuzzy parser, since dateutil decides between a local and a UTC 
+	timezone for those depending on the machine it is running on.
+	'''
+	if not isinstance(input_text, basestring):
+		return None
+
+	m = _ISO_TEMPORAL.match(input_text)
 
-import dateutil
-from dateutil import relativedelta, rrule, parser
+	if m is not None:
+		year, month, day, hour, minute, second, fraction, sign, offset_hours, offset_minutes = m.groups()
+		dt = _build_temporal(int(year), int(month), int(day), hour, minute, second, fraction)
 
-from dateutil.relativedelta import *
-from dateutil.rrule import *
-from dateutil.parser import *
+		if dt is None or sign is None:
+			return dt
+
+		offset = int(offset_hours) * 3600 + int(offset_minutes or 0) * 60
+
+		if offset == 0:
+			return None
+
+		if sign == '-':
+			offset = -offset
+
+		tzinfo = _tzoffsets.get(offset)
+
+		if tzinfo is None:
+			tzinfo = _tzoffsets[offset] = tz.tzoffset(None, offset)
+
+		return dt.replace(tzinfo=tzinfo)
+
+	m = _SLASH_TEMPORAL.match(input_text)
+
+	if m is not None:
+		first, middle, last, hour, minute, second, fraction = m.groups()
+
+		if len(first) == 4:
+			# 1999/12/31
+			year, month, day = int(first), int(middle), int(last)
+		elif len(last) == 4:
+			# 12/31/1999, or 31/12/1999 when the first value can't be a month
+			year, month, day = int(last), int(first), int(middle)
+
+			if month > 12:
+				month, day = day, month
+		else:
+			# two digit years are resolved relative to the current century by dateutil
+			return None
+
+		return _build_temporal(year, month, day, hour, minute, second, fraction)
+
+	return None
 
 @outputSchema("dttm:chararray")
-def parse_temporal(input_text):
+def parse_temporal(input_text, errors=None):
 	'''
 	Returns a valid python datetime object and returns it as a string. It will attempt to automatically 
 	format the input string and will throw an exception if it cannot.
@@ -119,6 +592,13 @@ def parse_temporal(input_text):
 	this function what your date/time value looks like, you can simply provide the information
 	as a text string and it will figure out the rest.  
 	
+	Recently parsed values are cached, and well-formed ISO 8601 and numeric slash formats are
+	recognized directly, so only the less regular values pay for the fuzzy parser.
+	
+	A python datetime is returned as it is, so every function in this library can also be given a 
+	datetime instead of a string, and functions built on each other pass datetimes along rather than
+	formatting and re-parsing strings.
+	
 	See http://labix.org/python-dateutil#head-1443e0f14ad5dff07efd465e080d1110920673d8-2 for
 	examples of the different date and time formats that can be used.  It could be anything from
 	"12/31/1999" to "Today is 25 of September of 2003, exactly at 10:49:41 with timezone -03:00."
@@ -126,21 +606,78 @@ def parse_temporal(input_text):
 	If you really want to provide a specific format, use the parse_formatted_temporal() 
 	or temporal_from_parts() functions instead.  However, this function is much easier to use.
 	
+	Values that can't be parsed raise an exception, unless the error policy says otherwise (see 
+	set_error_policy()), in which case they return None without raising anything.
+	
 	Usage:
 	
 		parse_temporal("2000-12-31 23:59:59")
 		parse_temporal("31st of 2003, exactly at 23:59 with 59 seconds")
+		parse_temporal("garbage", 'null')
 	
 	Parameters:
 	
-		input_text, a string containing a datetime value.
+		input_text, a string containing a datetime value (or a python datetime).
+		errors: the error policy for this call, 'raise', 'null' or 'quarantine' (optional, defaults to the module's policy).
 	
 	Returns:
 	
 		A python datetime (if called from Python) or a string containing an ISO formatted date time (if called from Pig).
 	
 	'''
-	return parser.parse(input_text, fuzzy=True)
+	if isinstance(input_text, datetime):
+		return input_text
+
+	if _metrics is not None:
+		dt = _metrics.parse(input_text)
+	else:
+		dt = _parse_cache.get(input_text)
+
+		if dt is None:
+			dt = _parse_fresh(input_text)
+			_parse_cache.put(input_text, dt)
+
+	if dt.__class__ is _Rejected:
+		return _reject(input_text, dt.error, errors)
+
+	return dt
+
+def _lookup_temporal(input_text):
+	'''
+	Does the work of parse_temporal() without applying an error policy, returning a datetime, or a 
+	_Rejected for a value that can't be parsed, so the batch functions can apply the policy themselves.
+	'''
+	if isinstance(input_text, datetime):
+		return input_text
+
+	if _metrics is not None:
+		return _metrics.parse(input_text)
+
+	dt = _parse_cache.get(input_text)
+
+	if dt is None:
+		dt = _parse_fresh(input_text)
+		_parse_cache.put(input_text, dt)
+
+	return dt
+
+def _parse_fresh(input_text):
+	'''
+	Parses a temporal value that isn't in the cache, trying the fast path before the fuzzy parser.
+	Returns a _Rejected instead of raising if the value can't be parsed.
+	'''
+	dt = _scan_temporal(input_text)
+
+	if dt is None:
+		if _metrics is not None:
+			_metrics.fuzzy_parses += 1
+
+		try:
+			dt = parser.parse(input_text, fuzzy=True)
+		except (ValueError, OverflowError, TypeError, AttributeError), error:
+			return _Rejected(error)
+
+	return dt
 
 @outputSchema("dttm:chararray")
 def temporal_from_parts(year=1970,month=1,day=1,hour=0,minute=0,second=0,microsecond=0):
@@ -172,14 +709,16 @@ def temporal_from_parts(year=1970,month=1,day=1,hour=0,minute=0,second=0,microse
 	return str(datetime(year,month,day,hour,minute,second,microsecond))
 
 @outputSchema("dttm:chararray")
-def parse_formatted_temporal(input_text, input_format="%Y-%m-%d %H:%M:%S"):
+def parse_formatted_temporal(input_text, input_format="%Y-%m-%d %H:%M:%S", errors=None):
 	'''
 	Returns a datetime from the string.  You cannot make an invalid datetime with this function.
+	A value that doesn't match the format is handled by the error policy (see set_error_policy()).
 	
 	Parameters:
 
 		input_text: an integer, defaults to 1970
 		input_format: a text string that can be used by Python to interpret input_text properly.
+		errors: the error policy for this call, 'raise', 'null' or 'quarantine' (optional, defaults to the module's policy).
 				
 	Usage:
 	
@@ -197,576 +736,4567 @@ def parse_formatted_temporal(input_text, input_format="%Y-%m-%d %H:%M:%S"):
 		A python datetime (if called from Python) or a string containing an ISO formatted date time (if called from Pig).
 
 	'''	
-	return datetime.strptime(input_text, input_format)
+	try:
+		return datetime.strptime(input_text, input_format)
+	except (ValueError, TypeError), error:
+		return _reject(input_text, error, errors)
 
-@outputSchema("part:chararray")
-def date_name(date_part, input_text):
-	'''
-	Returns a character string representing the specific part of the specified datetime.  While
-	it primarily parts out logic to other functions, everything returned from this function will
-	be formatted as a character string, making for more consistent handling.
+# The formats considered by infer_temporal_format(), in order of preference when more than one of them
+# matches the same number of sample values.  Month first comes before day first, and day first before
+# year first, which is how dateutil resolves an ambiguous value.
+TEMPORAL_FORMATS = [
+	'%Y-%m-%d %H:%M:%S.%f',
+	'%Y-%m-%dT%H:%M:%S.%f',
+	'%Y-%m-%d %H:%M',
+	'%Y-%m-%dT%H:%M',
+	'%Y-%m-%d',
+	'%Y%m%d',
+	'%m/%d/%Y %H:%M:%S.%f',
+	'%m/%d/%Y %H:%M',
+	'%m/%d/%Y',
+	'%d/%m/%Y %H:%M:%S.%f',
+	'%d/%m/%Y %H:%M',
+	'%d/%m/%Y',
+	'%Y/%m/%d %H:%M:%S.%f',
+	'%Y/%m/%d %H:%M',
+	'%Y/%m/%d',
+	'%m/%d/%y %H:%M:%S',
+	'%m/%d/%y',
+	'%d/%m/%y %H:%M:%S',
+	'%d/%m/%y',
+	'%y/%m/%d',
+	'%m-%d-%Y',
+	'%d-%m-%Y',
+	'%d.%m.%Y %H:%M:%S',
+	'%d.%m.%Y',
+]
 
-	Notes:
-	
-		This is a useful function seen in T-SQL. See http://msdn.microsoft.com/en-us/library/ms174395.aspx for more details.
+# the pattern matched by each supported directive, and the datetime field it fills in
+_FORMAT_DIRECTIVES = {
+	'Y': (r'(\d{4})', 'year'),
+	'y': (r'(\d{2})', 'short_year'),
+	'm': (r'(\d{1,2})', 'month'),
+	'd': (r'(\d{1,2})', 'day'),
+	'H': (r'(\d{1,2})', 'hour'),
+	'M': (r'(\d{1,2})', 'minute'),
+	'S': (r'(\d{1,2})', 'second'),
+	'f': (r'(\d{1,6})\d*', 'microsecond'),
+}
 
+_parserinfo = None
 
-	Usage:
-	
-		date_name('year', '1999-12-31 23:59:59') returns '1999'
-		date_name('month', '1999-12-31 23:59:59') returns '12'
-		date_name('day', '1999-12-31 23:59:59') returns '31'
-		date_name('day_name', '1999-12-31 23:59:59') returns 'friday'
-		date_name('day_of_week', '1999-12-31 23:59:59') returns '5'
+def _convert_year(text):
+	'''
+	Places a two digit year in a century the same way that dateutil does.
+	'''
+	global _parserinfo
 
-	Parameters:
+	if _parserinfo is None:
+		_parserinfo = parser.parserinfo()
 
-		date_part: a text string containing an english name of the part that should be returned. This could be 
-		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
-		
-		input_text: a string with a datetime value.
-				
-	Returns:
-	
-		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+	return _parserinfo.convertyear(int(text))
 
+def _fraction(text):
 	'''
-	
-	if date_part == 'year' or date_part == 'yy' or date_part == 'yyyy':
-		return str(year(input_text))
-	elif date_part == 'quarter' or date_part == 'qq' or date_part == 'q':
-		return str(quarter(input_text))
-	elif date_part == 'month' or date_part == 'mm' or date_part == 'm':
-		return str(month(input_text))
-	elif date_part == 'day_of_year' or date_part == 'dy' or date_part == 'y':
-		return str(day_of_year(input_text))
-	elif date_part == 'day_name' or date_part == 'dn':
-		return str(day_name(input_text))
-	elif date_part == 'day' or date_part == 'dd' or date_part == 'd':
-		return str(day(input_text))
-	elif date_part == 'week' or date_part == 'wk' or date_part == 'ww':
-		return str(week(input_text))
-	elif date_part == 'weekday' or date_part == 'dw':
-		return weekday(input_text)
-	elif date_part == 'day_of_week' or date_part == 'dow':
-		return str(day_of_week(input_text))	
-	elif date_part == 'hour' or date_part == 'hh':
-		return str(hour(input_text))
-	elif date_part == 'minute' or date_part == 'mi' or date_part == 'n':
-		return str(minute(input_text))
-	elif date_part == 'second' or date_part == 'ss' or date_part == 's':
-		return str(second(input_text))
-	elif date_part == 'microsecond' or date_part == 'mcs':
-		return str(microsoecond(input_text))
-	elif date_part == 'epoch' or date_part == 'unix' or date_part == 'ep':
-		return str(epoch(input_text))
-	elif date_part == 'TZoffset' or date_part == 'tz':
-		return tz_offset(input_text)
-	elif date_part == 'ISO_WEEK' or date_part == 'iso_wk' or date_part == 'isoww':
-		return str(iso_week(input_text))
-	else:
-		return ''
+	Converts the digits after the decimal point of a second to microseconds.
+	'''
+	if not text:
+		return 0
 
-@outputSchema("part:chararray")
-def date_diff(date_part, start_text, end_text):
+	return int(text.ljust(6, '0'))
+
+class TemporalFormat(object):
 	'''
-	Returns a character string representing the specific part of the difference between two specified datetimes.  While
-	it primarily parts out logic to other functions, everything returned from this function will
-	be formatted as a character string, making for more consistent handling.
+	A parse plan compiled from a single format, for columns where every value (or nearly every value) is
+	written the same way.  Values that match the plan are built directly, while anything else is passed 
+	along to parse_temporal(), and the number of values that took each path is counted.
 
-	Notes:
-	
-		(1) This is a useful function seen in T-SQL. See http://msdn.microsoft.com/en-us/library/ms189794.aspx for more details.
+	The plan understands the numeric strptime directives (%Y, %y, %m, %d, %H, %M, %S and %f).  A '.%f' 
+	in the format is optional, so '%Y-%m-%d %H:%M:%S.%f' handles values with and without fractional 
+	seconds.  Two digit years are placed in a century the same way dateutil does it.
 
 	Usage:
-	
-		date_name('year', '1999-12-31 23:59:59') returns '1999'
-		date_name('month', '1999-12-31 23:59:59') returns '12'
-		date_name('day', '1999-12-31 23:59:59') returns '31'
-		date_name('day_name', '1999-12-31 23:59:59') returns 'friday'
-		date_name('day_of_week', '1999-12-31 23:59:59') returns '5'
+
+		plan = TemporalFormat('%d/%m/%Y %H:%M')
+		plan.parse('31/12/1999 23:59')
+		plan.stats()
 
 	Parameters:
-	
-		date_part: a text string containing an english name of the part that should be returned. This could be 
-		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
-		
-		start_text: a string with a datetime value representing the start of the period.
-		
-		end_text: a string with a datetime value representing the end of the period..
-				
-	Returns:
-	
-		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+
+		input_format: the format of the values, or None for a plan that sends everything to parse_temporal().
 
 	'''
-	
-	start_dt = parse_temporal(start_text)
-	end_dt = parse_temporal(end_text)
 
-	# this should be a positive number
-	delta = relativedelta(parse_temporal(end_text), parse_temporal(start_text))
+	def __init__(self, input_format):
+		self.format = input_format
+		self.fast_count = 0
+		self.slow_count = 0
+		self._pattern = None
+		self._build = None
+		self._fields = []
 
-	if date_part == 'year' or date_part == 'yy' or date_part == 'yyyy':
-		return str(delta.years)
-	elif date_part == 'quarter' or date_part == 'qq' or date_part == 'q':			
-		return (((end_dt.years * 4) + (4-quarter(end_text))) - ((start_dt.years * 4) + (4-quarter(start_text))))
-	elif date_part == 'month' or date_part == 'mm' or date_part == 'm':
-		return str(delta.months)
-	elif date_part == 'day' or date_part == 'dd' or date_part == 'd':
-		return str(delta.days)
-	elif date_part == 'week' or date_part == 'wk' or date_part == 'ww':
-		return str(delta.weeks)
-	elif date_part == 'hour' or date_part == 'hh':
-		return str(delta.hours)
-	elif date_part == 'minute' or date_part == 'mi' or date_part == 'n':
-		return str(delta.minutes)
-	elif date_part == 'second' or date_part == 'ss' or date_part == 's':
-		return str(delta.seconds)
-	elif date_part == 'microsecond' or date_part == 'mcs':
-		return str(delta.microseconds)
-	else:
-		return ''
+		if input_format is not None:
+			self._compile(input_format)
 
-@outputSchema("part:chararray")
-def date_add(date_part, number, input_text):
-	'''
-	Returns a character string representing the the datetime with a certain number of units added to it. 
+	def __repr__(self):
+		return 'TemporalFormat(%r)' % (self.format,)
 
-	Notes:
-	
-		(1) This is a useful function seen in T-SQL. See http://msdn.microsoft.com/en-us/library/ms189794.aspx for more details.
+	def _compile(self, input_format):
+		pattern = [r'\s*']
+		i = 0
 
-	Usage:
-	
-		date_add('year', 1, '1999-12-31 23:59:59') returns '2000-12-31 23:59:59'
-		date_add('year', -1, '1999-12-31 23:59:59') returns '1998-12-31 23:59:59'
-		date_add('quarter', 2, '1999-12-31 23:59:59') returns '2000-05-31 23:59:59'
-		date_add('month', 12, '1999-12-31 23:59:59') returns '2000-12-31 23:59:59'
-		date_add('second', -1, '1999-12-31 23:59:59') returns '1999-12-31 23:59:58'
+		while i < len(input_format):
+			c = input_format[i]
 
-	Parameters:
+			if c != '%':
+				pattern.append(re.escape(c))
+				i += 1
+				continue
 
-		date_part: a text string containing an english name of the part that should be returned. This could be 
-		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
-		
-		number: the number to add to the datetime.  This can be positive or negative.
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-				
-	Returns:
-	
-		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+			directive = input_format[i+1:i+2]
 
-	'''	
-	dt = parse_temporal(input_text)
-	
-	if date_part == 'year' or date_part == 'yy' or date_part == 'yyyy':
-		return str(dt+relativedelta(years=+number))
-	elif date_part == 'quarter' or date_part == 'qq' or date_part == 'q':			
-		return str(dt+relativedelta(months=+(3*number)))
-	elif date_part == 'month' or date_part == 'mm' or date_part == 'm':
-		return str(dt+relativedelta(months=+number))
-	elif date_part == 'week' or date_part == 'wk' or date_part == 'ww':
-		return str(dt+relativedelta(weeks=+number))
-	elif date_part == 'day' or date_part == 'dd' or date_part == 'd':
-		return str(dt+relativedelta(days=+number))
-	elif date_part == 'hour' or date_part == 'hh':
-		return str(dt+relativedelta(hours=+number))
-	elif date_part == 'minute' or date_part == 'mi' or date_part == 'n':
-		return str(dt+relativedelta(minutes=+number))
-	elif date_part == 'second' or date_part == 'ss' or date_part == 's':
-		return str(dt+relativedelta(seconds=+number))
-	elif date_part == 'microsecond' or date_part == 'mcs':
-		return str(dt+relativedelta(microseconds=+number))
-	else:
-		return ''
+			if directive not in _FORMAT_DIRECTIVES:
+				raise ValueError("unsupported directive '%%%s' in format '%s'" % (directive, input_format))
 
-@outputSchema("dt:chararray")
-def date_trunc(date_part, input_text):
-	'''
-	Truncates a datetime down to the unit specified. All precision below the date_part will be removed.
+			directive_pattern, field = _FORMAT_DIRECTIVES[directive]
 
-	Notes:
-	
-		(1) This is a useful function seen in Oracle, Postgres, and others. See http://msdn.microsoft.com/en-us/library/ms189794.aspx for more details.
+			if directive == 'f' and pattern[-1] == re.escape('.'):
+				# fractional seconds are optional
+				pattern[-1] = r'(?:\.' + directive_pattern + ')?'
+			else:
+				pattern.append(directive_pattern)
 
-	Usage:
-	
-		date_trunc('year', '1999-12-31 23:59:59') returns '1999-01-01 00:00:00'
-		date_trunc('quarter', '1999-12-31 23:59:59') returns '1999-10-01 00:00:00'
-		date_trunc('month', '1999-12-31 23:59:59') returns '1999-12-01 00:00:00'
-		date_trunc('day', '1999-12-31 23:59:59') returns '1999-12-31 00:00:00'
-		date_trunc('minute', '1999-12-31 23:59:59') returns '1999-12-31 23:59:00'
+			self._fields.append(field)
+			i += 2
 
-	Parameters:
+		pattern.append(r'\s*$')
+		self._pattern = re.compile(''.join(pattern))
 
-		date_part: a text string containing an english name of the part that should be returned. This could be 
-		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-				
-	Returns:
-	
-		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+		# work out the group and converter of each datetime argument once (a field that isn't in the
+		# format has no group, and its default in place of a converter), so that matching a value
+		# doesn't have to look at the format again
+		arguments = []
 
-	'''	
-	
-	input_dt = parse_temporal(input_text)
+		for field, default in (('year', 1900), ('month', 1), ('day', 1), 
+				('hour', 0), ('minute', 0), ('second', 0), ('microsecond', 0)):
+			if field == 'year' and 'short_year' in self._fields:
+				arguments.append((self._fields.index('short_year'), _convert_year))
+			elif field == 'microsecond' and field in self._fields:
+				arguments.append((self._fields.index(field), _fraction))
+			elif field in self._fields:
+				arguments.append((self._fields.index(field), int))
+			else:
+				arguments.append((None, default))
 
-	if date_part == 'year' or date_part == 'yy' or date_part == 'yyyy':
-		return str(input_dt.replace(month=1,day=1,hour=0, minute=0, second=0, microsecond=0))
-	elif date_part == 'quarter' or date_part == 'qq' or date_part == 'q':			
-		return str(input_dt.replace(month=(3*((quarter(str(input_dt)))-1))+1,day=1,hour=0, minute=0, second=0, microsecond=0))
-	elif date_part == 'month' or date_part == 'mm' or date_part == 'm':
-		return str(input_dt.replace(day=1,hour=0, minute=0, second=0, microsecond=0))
-	elif date_part == 'day' or date_part == 'dd' or date_part == 'd':
-		return str(input_dt.replace(hour=0, minute=0, second=0, microsecond=0))
-	elif date_part == 'hour' or date_part == 'hh':
-		return str(input_dt.replace(minute=0, second=0, microsecond=0))
-	elif date_part == 'minute' or date_part == 'mi' or date_part == 'n':
-		return str(input_dt.replace(second=0, microsecond=0))
-	elif date_part == 'second' or date_part == 'ss' or date_part == 's':
-		return str(input_dt.replace(microsecond=0))
-	else:
-		return ''	
+		arguments = tuple(arguments)
 
-@outputSchema("dt:chararray")
-def date_start_of(date_part, input_text):
-	'''
-	A synonym for the date_trunc function.
-	
-	Parameters:
+		def build(g):
+			return datetime(*[convert if i is None else convert(g[i]) for i, convert in arguments])
 
-		date_part: a text string containing an english name of the part that should be returned. This could be 
-		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
-		
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-	
-	Returns:
-		
-		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+		self._build = build
 
-	'''
-	
-	return date_trunc(date_part, input_text)
+	def match(self, input_text):
+		'''
+		Returns a datetime if input_text fits the plan, or None if it does not.
+		'''
+		if self._pattern is None or not isinstance(input_text, basestring):
+			return None
 
-@outputSchema("dt:chararray")
-def date_end_of(date_part, input_text):
+		m = self._pattern.match(input_text)
+
+		if m is None:
+			return None
+
+		try:
+			return self._build(m.groups())
+		except ValueError:
+			return None
+
+	def parse(self, input_text, errors=None):
+		'''
+		Returns a datetime for input_text, using the plan if the value fits it and parse_temporal() (with 
+		the error policy errors) otherwise.
+		'''
+		dt = self.match(input_text)
+
+		if dt is None:
+			self.slow_count += 1
+			return parse_temporal(input_text, errors)
+
+		self.fast_count += 1
+		return dt
+
+	def stats(self):
+		'''
+		Returns a dictionary with the format and the number of values parsed by the plan (fast) and by parse_temporal() (slow).
+		'''
+		return {'format': self.format, 'fast': self.fast_count, 'slow': self.slow_count}
+
+def infer_temporal_format(values, sample_size=100, formats=None):
 	'''
-	Returns a datetime representing the last second of the time period containing the datetime specified.  
+	Looks at the first sample_size values of a column and returns a TemporalFormat for the format 
+	that fits most of them.  This resolves day first and year first ambiguity from the column as a 
+	whole: '01/02/1999' could be either January or February, but if other values in the column 
+	look like '13/02/1999' then the whole column is read day first.
 
 	Usage:
-	
-		date_end_of('year', '1999-12-01 01:02:03') returns '1999-12-31 23:59:59'
-		date_end_of('quarter', '1999-12-31 23:59:59') returns '1999-12-31 23:59:59'
-		date_end_of('month', '1999-12-31 23:59:59') returns '1999-12-31 23:59:59'
-		date_end_of('day', '1999-12-31 23:59:59') returns '1999-12-31 23:59:59'
-		date_end_of('minute', '1999-12-31 23:59:59') returns '1999-12-31 23:59:59'
 
-		Notes:
+		plan = infer_temporal_format(timestamps)
+		parsed = [plan.parse(t) for t in timestamps]
 
-		(1) This can be combined nicely with the date_start_of function to isolate a range of values.
-	
 	Parameters:
 
-		date_part: a text string containing an english name of the part that should be returned. This could be 
-		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-				
-	Returns:
-	
-		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+		values: an iterable of temporal values.  Only the sample is consumed from it.
+		sample_size: the number of (non-empty) values to look at.
+		formats: the candidate formats, defaults to TEMPORAL_FORMATS.
 
-	'''	
-	
-	input_dt = parse_temporal(input_text)
+	Returns:
 
-	if date_part == 'year' or date_part == 'yy' or date_part == 'yyyy':
-		return date_add('second', -1, str(date_trunc('quarter', str(input_dt+relativedelta(months=+12)))))
-	elif date_part == 'quarter' or date_part == 'qq' or date_part == 'q':			
-		return date_add('second', -1, str(date_trunc('quarter', str(input_dt+relativedelta(months=+3)))))
-	elif date_part == 'month' or date_part == 'mm' or date_part == 'm':
-		return date_add('second', -1, str(date_trunc('quarter', str(input_dt+relativedelta(months=+1)))))
-	elif date_part == 'day' or date_part == 'dd' or date_part == 'd':
-		return date_add('second', -1, str(date_trunc('day', str(input_dt+relativedelta(days=+1)))))
-	elif date_part == 'hour' or date_part == 'hh':
-		return date_add('second', -1, str(date_trunc('day', str(input_dt+relativedelta(hours=+1)))))
-	elif date_part == 'minute' or date_part == 'mi' or date_part == 'n':
-		return date_add('second', -1, str(date_trunc('day', str(input_dt+relativedelta(minutes=+1)))))
-	else:
-		return ''		
+		A TemporalFormat.  If none of the candidates fit any of the sample it will send every value to parse_temporal().
 
-				
-@outputSchema("dttm:chararray")
-def today():
 	'''
-	A function to return today's date.  This can be combined nicely with date_add for ranges.
+	if formats is None:
+		formats = TEMPORAL_FORMATS
 
-	Parameters:
-				
-	Returns:
-	
-		A string containing todays date.
+	sample = []
 
-	'''	
-	
-	return str(date.today())
+	for value in values:
+		if len(sample) >= sample_size:
+			break
+		if value:
+			sample.append(value)
 
+	best = TemporalFormat(None)
+	best_count = 0
 
-@outputSchema("dttm:chararray")
-def now():
+	for input_format in formats:
+		plan = TemporalFormat(input_format)
+		count = 0
+
+		for value in sample:
+			if plan.match(value) is not None:
+				count += 1
+
+		if count > best_count:
+			best, best_count = plan, count
+
+			if count == len(sample):
+				break
+
+	return best
+
+def parse_temporal_column(values, sample_size=100, formats=None, errors=None):
 	'''
-	A function to return the current date and time.  This can be combined nicely with date_add for ranges.
+	Parses a whole column of temporal values, inferring the format from the first sample_size values
+	and then parsing the rest with it.  Values that don't fit the inferred format are parsed with 
+	parse_temporal() instead.  Values that can't be parsed at all are handled by the error policy, 
+	and quarantined ones are kept with their position in the column as the row.
+
+	Usage:
+
+		parsed, plan = parse_temporal_column(timestamps)
+		plan.slow_count
+
+		parsed, plan = parse_temporal_column(timestamps, errors='quarantine')
+		error_quarantine().records
 
 	Parameters:
-				
+
+		values: a sequence of temporal values.
+		sample_size: the number of values to infer the format from.
+		formats: the candidate formats, defaults to TEMPORAL_FORMATS.
+		errors: the error policy, 'raise', 'null' or 'quarantine' (optional, defaults to the module's policy).
+
 	Returns:
-	
-		A string containing the date and time when this function was called.
 
-	'''	
-	
-	return str(datetime.now())
+		A tuple of a list of python datetimes (None for rejected values) and the TemporalFormat used, 
+		which reports how many values had to take the slow path.
 
-		
-@outputSchema("year:int")
-def year(input_text):
 	'''
-	Get the year for a particular temporal value.
+	values = list(values)
+	plan = infer_temporal_format(values, sample_size, formats)
+	match = plan.match
+	parsed = []
 
-	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
-	
-		An integer with the year.
-	'''	
+	for row, value in enumerate(values):
+		dt = match(value)
 
-	return parse_temporal(input_text).year
-	
-@outputSchema("month:int")
-def month(input_text):
+		if dt is None:
+			plan.slow_count += 1
+			dt = _lookup_temporal(value)
+
+			if dt.__class__ is _Rejected:
+				dt = _reject(value, dt.error, errors, row)
+		else:
+			plan.fast_count += 1
+
+		parsed.append(dt)
+
+	return parsed, plan
+
+# Integer arithmetic on temporal values.  Values are handled as whole microseconds since 1970-01-01
+# (wall clock time, ignoring any timezone) with day numbers taken from the proleptic Gregorian ordinal,
+# so fixed-width units are integer additions and floor divisions, and calendar units (month, quarter,
+# year) are integer arithmetic on year*12 + month with the day clamped to the length of the month.
+
+_MICROSECONDS = {
+	'week': 7 * 86400000000,
+	'day': 86400000000,
+	'hour': 3600000000,
+	'minute': 60000000,
+	'second': 1000000,
+	'microsecond': 1,
+}
+
+_MONTHS = {
+	'year': 12,
+	'quarter': 3,
+	'month': 1,
+}
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+_DAYS_IN_MONTH = [0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+def _days_in_month(year, month):
+	if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+		return 29
+	return _DAYS_IN_MONTH[month]
+
+def _to_micros(dt):
 	'''
-	Get the month for a particular temporal value.
+	Returns the wall clock time of a python datetime as microseconds since 1970-01-01 00:00:00.
+	'''
+	return (((dt.toordinal() - _EPOCH_ORDINAL) * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second) 
+		* 1000000 + dt.microsecond)
 
-	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
-	
-		An integer with the month (1-12).
-	'''	
-	
-	return int(parse_temporal(input_text).month)
-	
-@outputSchema("day_of_year:int")
-def day_of_year(input_text):
+def _from_micros(micros, tzinfo=None):
 	'''
-	Get the day of the year for a particular temporal value.
+	Returns a python datetime for a number of microseconds since 1970-01-01 00:00:00.
+	'''
+	days, micros = divmod(micros, 86400000000)
+	seconds, microsecond = divmod(micros, 1000000)
+	d = date.fromordinal(days + _EPOCH_ORDINAL)
 
-	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
-	
-		An integer with the day of the year (1-366).
-	'''	
-	
-	return parse_temporal(input_text).timetuple().tm_yday
+	return datetime(d.year, d.month, d.day, seconds // 3600, seconds // 60 % 60, seconds % 60, microsecond, tzinfo)
 
-@outputSchema("day:int")
-def day(input_text):
+def _add_months(dt, months):
 	'''
-	Get the day for a particular temporal value.
+	Returns a python datetime with a number of months added, keeping the day unless the new month is too short.
+	'''
+	if months != int(months):
+		raise ValueError('months must be a whole number, not %r' % (months,))
 
-	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
-	
-		An integer with the day (1-31).
-	'''	
-	
-	return int(parse_temporal(input_text).day)
+	year, month = divmod(dt.year * 12 + dt.month - 1 + int(months), 12)
+	month += 1
+	day = dt.day
 
-@outputSchema("quarter:int")
-def quarter(input_text):
+	if day > 28:
+		day = min(day, _days_in_month(year, month))
+
+	return dt.replace(year=year, month=month, day=day)
+
+def _month_difference(start, end):
 	'''
-	Get the quarter for a particular temporal value.
+	Returns the whole number of months from start to end, and start with that many months added.
+	'''
+	months = (end.year - start.year) * 12 + end.month - start.month
+	anchor = _add_months(start, months)
 
-	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
-	
-		An integer with the quarter (1-4).
-	'''	
+	# the day and time may mean that the last month isn't complete
+	if end < start:
+		while end > anchor:
+			months += 1
+			anchor = _add_months(start, months)
+	else:
+		while end < anchor:
+			months -= 1
+			anchor = _add_months(start, months)
 
-	return (month(input_text)-1)//3 + 1
+	return months, anchor
 
-@outputSchema("week:int")
-def week(input_text):
+def _date_difference(start, end):
 	'''
-	Get the week of the year for a particular temporal value.
+	Returns the difference between two python datetimes as a dictionary of years, months, days, hours, 
+	minutes, seconds and microseconds, the same way that relativedelta(end, start) does.
+	'''
+	months, anchor = _month_difference(start, end)
+	delta = end - anchor
+	seconds = delta.days * 86400 + delta.seconds
 
-	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
-	
-		An integer with the week (1-52).
-	'''	
-	
-	return int(parse_temporal(input_text).strftime("%W"))
+	sign = -1 if months < 0 else 1
+	years, months = divmod(months * sign, 12)
 
-@outputSchema("week:int")
-def iso_week(input_text):
+	parts = {'years': years * sign, 'months': months * sign, 'microseconds': delta.microseconds}
+
+	sign = -1 if seconds < 0 else 1
+	seconds *= sign
+	parts['days'] = seconds // 86400 * sign
+	parts['hours'] = seconds // 3600 % 24 * sign
+	parts['minutes'] = seconds // 60 % 60 * sign
+	parts['seconds'] = seconds % 60 * sign
+
+	return parts
+
+# The range of years covered by the calendar lookup tables.  Days outside of it are computed directly.
+CALENDAR_START_YEAR = int(os.environ.get('DTTM_CALENDAR_START_YEAR', 1900))
+CALENDAR_END_YEAR = int(os.environ.get('DTTM_CALENDAR_END_YEAR', 2100))
+
+# the lookup tables, built the first time they are needed
+_calendar = None
+
+def calendar_table_range(start_year, end_year):
 	'''
-	Get the ISO defined week of the year for a particular temporal value.
+	Changes the range of years (inclusive) covered by the calendar lookup tables, which are rebuilt the next 
+	time they are used.  Each year in the range takes about 2KB.
+	'''
+	global CALENDAR_START_YEAR, CALENDAR_END_YEAR, _calendar
 
-	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
-	
-		An integer with the week (1-53).
-	'''	
-	
-	return int(parse_temporal(input_text).isocalendar()[1])
+	CALENDAR_START_YEAR, CALENDAR_END_YEAR = start_year, end_year
+	_calendar = None
 
-@outputSchema("weekday:chararray")
-def day_name(input_text):
+def _build_calendar():
 	'''
-	Get the day of the week as text for a particular temporal value.
+	Builds arrays indexed by the number of days since the start of CALENDAR_START_YEAR, holding the day of 
+	the year, week (as strftime('%W') numbers it) and weekday of each day.  The parts a datetime already 
+	carries, or computes cheaply (year, quarter, ISO week), aren't worth a table.
+	'''
+	import array
 
-	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
-	
-		An string with the text name of the day of the week.
-	'''	
-	
-	return parse_temporal(input_text).strftime("%A")
+	global _calendar
 
-@outputSchema("day_of_week:int")
-def day_of_week(input_text):
+	first = date(CALENDAR_START_YEAR, 1, 1).toordinal()
+	last = date(CALENDAR_END_YEAR, 12, 31).toordinal()
+
+	table = {
+		'first': first,
+		'size': last - first + 1,
+		'day_of_year': array.array('H'),
+		'week': array.array('B'),
+		'weekday': array.array('B'),
+		# the names of the days (Monday first) in the current locale, as strftime('%A') gives them
+		'day_names': [date(2001, 1, i).strftime('%A') for i in range(1, 8)],
+	}
+
+	for ordinal in xrange(first, last + 1):
+		d = date.fromordinal(ordinal)
+		weekday = d.weekday()
+		day_of_year = d.timetuple().tm_yday
+
+		table['day_of_year'].append(day_of_year)
+		table['week'].append((day_of_year + 6 - weekday) // 7)
+		table['weekday'].append(weekday)
+
+	_calendar = table
+	return table
+
+def _calendar_part(part, dt):
 	'''
-	Get the numeric day of the week for a particular temporal value.
+	Returns a calendar part (day_of_year, week, day_of_week or day_name) of a python datetime, 
+	looked up by its day in the calendar tables when it is in range, and computed otherwise.
+	'''
+	table = _calendar or _build_calendar()
+	i = dt.toordinal() - table['first']
+
+	if 0 <= i < table['size']:
+		if part == 'day_of_week':
+			return table['weekday'][i] + 1
+		elif part == 'day_name':
+			return table['day_names'][table['weekday'][i]]
+		else:
+			return table[part][i]
+
+	if part == 'day_of_year':
+		return dt.timetuple().tm_yday
+	elif part == 'week':
+		return int(dt.strftime("%W"))
+	elif part == 'day_of_week':
+		return dt.timetuple().tm_wday+1
+	elif part == 'day_name':
+		return dt.strftime("%A")
+
+_WEEKDAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+class BusinessCalendar(object):
+	'''
+	Which days are business days, given the days of the week that make up the weekend and a list of 
+	holidays.  Over the years covered by the calendar tables (see calendar_table_range()), a bitmap of 
+	the business days, a running count of them and a list of where each one falls are built once, so 
+	adding or counting business days is a lookup rather than a walk over the days in between.  Days
+	outside of those years are walked one at a time.
+
+	Adding business days counts from the business day on or before the value (on or after it, when 
+	subtracting) and keeps the time of day, so adding one business day to a Friday or a Saturday gives 
+	the next Monday.  The difference between two values is the number of business days after the first 
+	up to and including the second, so business_day_diff(a, business_day_add(a, n)) is n.
+
+	Usage:
+
+		calendar = BusinessCalendar(holidays=['2013-01-01', '2013-12-25'])
+		calendar = BusinessCalendar.from_file('holidays.txt', weekend='Fri,Sat')
+		calendar.business_day_add('2013-02-22 18:00', 1) returns datetime(2013, 2, 25, 18, 0)
+		calendar.business_day_diff('2013-02-01', '2013-02-28') returns 19
 
 	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
-	
-		An integer with the week (1-7).
-	'''	
-	
-	return int(parse_temporal(input_text).timetuple().tm_wday)+1
 
-@outputSchema("hour:int")
-def hour(input_text):
+		holidays: the temporal values of the holidays.
+		weekend: the days of the week that aren't business days, as a comma separated string of names
+			('Sat,Sun') or a list of names or numbers (where Monday is 0).
+
 	'''
-	Get the numeric hour of the day for a particular temporal value.
+
+	def __init__(self, holidays=(), weekend=(5, 6)):
+		import array
+
+		self.weekend = self._weekdays(weekend)
+
+		if len(self.weekend) == 7:
+			raise ValueError('a calendar needs at least one business day in the week')
+
+		self.holidays = set(parse_temporal(holiday, 'raise').toordinal() for holiday in holidays)
+
+		self.first = date(CALENDAR_START_YEAR, 1, 1).toordinal()
+		size = date(CALENDAR_END_YEAR, 12, 31).toordinal() - self.first + 1
+
+		# is each day a business day, how many business days come before it, and the position of
+		# each business day
+		self.bitmap = bytearray(size)
+		self.counts = array.array('i', [0]) * (size + 1)
+		self.days = array.array('i')
+
+		count = 0
+
+		for i in xrange(size):
+			ordinal = self.first + i
+
+			if (ordinal - 1) % 7 not in self.weekend and ordinal not in self.holidays:
+				self.bitmap[i] = 1
+				self.days.append(i)
+				count += 1
+
+			self.counts[i + 1] = count
+
+	def __repr__(self):
+		return 'BusinessCalendar(holidays=%d, weekend=%r)' % (len(self.holidays), 
+			','.join(_WEEKDAY_NAMES[day] for day in sorted(self.weekend)))
+
+	@classmethod
+	def from_file(cls, path, weekend=(5, 6)):
+		'''
+		Returns a calendar with the holidays listed in a file, one temporal value to a line.  Blank lines 
+		and anything after a '#' are ignored.
+		'''
+		holidays = []
+		holiday_file = open(path)
+
+		try:
+			for line in holiday_file:
+				line = line.split('#', 1)[0].strip()
+
+				if line:
+					holidays.append(line)
+		finally:
+			holiday_file.close()
+
+		return cls(holidays, weekend)
+
+	@staticmethod
+	def _weekdays(weekend):
+		if isinstance(weekend, basestring):
+			weekend = [day for day in weekend.split(',') if day.strip()]
+
+		weekdays = set()
+
+		for day in weekend:
+			if isinstance(day, basestring):
+				name = day.strip().lower()[:3]
+
+				if name not in _WEEKDAY_NAMES:
+					raise ValueError("unknown day of the week '%s'" % (day,))
+
+				day = _WEEKDAY_NAMES.index(name)
+
+			weekdays.add(int(day) % 7)
+
+		return weekdays
+
+	def _is_business_ordinal(self, ordinal):
+		i = ordinal - self.first
+
+		if 0 <= i < len(self.bitmap):
+			return self.bitmap[i] == 1
+
+		return (ordinal - 1) % 7 not in self.weekend and ordinal not in self.holidays
+
+	def is_business_day(self, input_text):
+		'''
+		Returns whether a temporal value falls on a business day.
+		'''
+		return self._is_business_ordinal(parse_temporal(input_text, 'raise').toordinal())
+
+	def business_day_add(self, input_text, number):
+		'''
+		Returns a python datetime with a whole number of business days added to (or, if number is negative, 
+		subtracted from) a temporal value.  Adding zero returns the value as it is.
+		'''
+		if number != int(number):
+			raise ValueError('business days must be a whole number, not %r' % (number,))
+
+		dt = parse_temporal(input_text, 'raise')
+		number = int(number)
+
+		if number == 0:
+			return dt
+
+		ordinal = dt.toordinal()
+		i = ordinal - self.first
+
+		if 0 <= i < len(self.bitmap):
+			if number > 0:
+				# from the last business day on or before the day
+				position = self.counts[i + 1] - 1 + number
+			else:
+				# from the first business day on or after the day
+				position = self.counts[i] + number
+
+			if 0 <= position < len(self.days):
+				return dt + timedelta(days=self.days[position] - i)
+
+		# outside the tables, walk the days
+		step = number > 0 and 1 or -1
+		remaining = abs(number)
+
+		while remaining:
+			ordinal += step
+
+			if self._is_business_ordinal(ordinal):
+				remaining -= 1
+
+		return dt + timedelta(days=ordinal - dt.toordinal())
+
+	def business_day_diff(self, start_text, end_text):
+		'''
+		Returns the number of business days after start_text up to and including end_text, which is 
+		negative if end_text is before start_text.
+		'''
+		start = parse_temporal(start_text, 'raise').toordinal()
+		end = parse_temporal(end_text, 'raise').toordinal()
+		last = len(self.bitmap)
+
+		if 0 <= start - self.first < last and 0 <= end - self.first < last:
+			return self.counts[end - self.first + 1] - self.counts[start - self.first + 1]
+
+		# outside the tables, walk the days
+		low, high = min(start, end), max(start, end)
+		count = 0
+
+		for ordinal in xrange(low + 1, high + 1):
+			if self._is_business_ordinal(ordinal):
+				count += 1
+
+		return end < start and -count or count
+
+# The calendar used for 'business_day' in date_add() and date_diff() and by the business day functions,
+# built the first time it is needed from the file named by DTTM_HOLIDAYS (or with no holidays).
+_business_calendar = None
+
+def set_business_calendar(calendar):
+	'''
+	Sets the calendar used by the business day functions and the 'business_day' date part, given either 
+	a BusinessCalendar or the path of a file of holidays.  None goes back to the default.
+	'''
+	global _business_calendar
+
+	if isinstance(calendar, basestring):
+		calendar = BusinessCalendar.from_file(calendar)
+
+	_business_calendar = calendar
+
+def _default_business_calendar():
+	global _business_calendar
+
+	if _business_calendar is None:
+		path = os.environ.get('DTTM_HOLIDAYS')
+
+		if path:
+			_business_calendar = BusinessCalendar.from_file(path)
+		else:
+			_business_calendar = BusinessCalendar()
+
+	return _business_calendar
+
+@outputSchema("dt:chararray")
+def business_day_add(number, input_text):
+	'''
+	Adds a number of business days to a temporal value, skipping weekends and holidays.  The same as
+	date_add('bday', number, input_text).
+
+	Usage:
+
+		business_day_add(1, '2013-02-22 18:00:00') returns '2013-02-25 18:00:00'
+		business_day_add(-1, '2013-02-25') returns '2013-02-22 00:00:00'
 
 	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
+
+		number: the whole number of business days to add, which can be negative.
+		input_text: a string with a datetime value.
+
 	Returns:
-	
-		An integer with the hour (0-23).
-	'''	
-	
-	return int(parse_temporal(input_text).hour)
 
-@outputSchema("minute:int")
-def minute(input_text):
+		A string containing the new datetime.
+
 	'''
-	Get the numeric minute of the hour for a particular temporal value.
+	dt = parse_temporal(input_text)
 
-	Parameters:
+	if dt is None:
+		return None
+
+	return str(_default_business_calendar().business_day_add(dt, number))
+
+@outputSchema("business_days:int")
+def business_day_diff(start_text, end_text):
+	'''
+	Returns the number of business days after start_text up to and including end_text.  The same as 
+	date_diff('bday', start_text, end_text), but as a number.
+
+	Usage:
+
+		business_day_diff('2013-02-22', '2013-02-25') returns 1
+
+	'''
+	start_dt = parse_temporal(start_text)
+	end_dt = parse_temporal(end_text)
+
+	if start_dt is None or end_dt is None:
+		return None
+
+	return _default_business_calendar().business_day_diff(start_dt, end_dt)
+
+@outputSchema("business_day:boolean")
+def is_business_day(input_text):
+	'''
+	Returns whether a temporal value falls on a business day of the calendar set with set_business_calendar().
+	'''
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return _default_business_calendar().is_business_day(dt)
+
+@outputSchema("part:chararray")
+def date_name(date_part, input_text):
+	'''
+	Returns a character string representing the specific part of the specified datetime.  While
+	it primarily parts out logic to other functions, everything returned from this function will
+	be formatted as a character string, making for more consistent handling.
+
+	Notes:
 	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
+		This is a useful function seen in T-SQL. See http://msdn.microsoft.com/en-us/library/ms174395.aspx for more details.
+
+
+	Usage:
+	
+		date_name('year', '1999-12-31 23:59:59') returns '1999'
+		date_name('month', '1999-12-31 23:59:59') returns '12'
+		date_name('day', '1999-12-31 23:59:59') returns '31'
+		date_name('day_name', '1999-12-31 23:59:59') returns 'friday'
+		date_name('day_of_week', '1999-12-31 23:59:59') returns '5'
+
+	Parameters:
+
+		date_part: a text string containing an english name of the part that should be returned. This could be 
+		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
+		
+		input_text: a string with a datetime value.
+				
 	Returns:
 	
-		An integer with the hour (0-59).
-	'''	
+		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+
+	'''
 	
-	return int(parse_temporal(input_text).minute)
+	part = _DATE_PARTS.get(date_part)
 
-@outputSchema("second:int")
-def second(input_text):
+	if part is None:
+		return ''
+
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return str(_date_part_of(part, dt))
+
+@outputSchema("parts:tuple()")
+def date_parts(date_parts, input_text):
 	'''
-	Get the numeric second of the minute for a particular temporal value.
+	Returns a tuple with several parts of the same datetime, formatted as character strings the same 
+	way that date_name() does.  The temporal value is only parsed once, no matter how many parts are
+	asked for, so this is much cheaper than calling date_name() for each of them.
 
-	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
+	Usage:
 	
-		An integer with the second (0-59).
-	'''		
-	return int(parse_temporal(input_text).second)
+		date_parts('year,month,day', '1999-12-31 23:59:59') returns ('1999', '12', '31')
+		date_parts('dn,hh,tz', '1999-12-31 23:59:59') returns ('Friday', '23', '')
 
-@outputSchema("microsecond:long")
-def microsecond(input_text):
-	'''
-	Get the numeric microsoecond for a particular temporal value.
+		In Pig, flatten the tuple to get one column per part:
+
+		FOREACH dts GENERATE FLATTEN(dttm.date_parts('yy,mm,dd', timestamp)) AS (year, month, day);
 
 	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
+
+		date_parts: a comma separated string (or a list) of the parts that should be returned, using the
+		same names and abbreviations as date_name().
+		
+		input_text: a string with a datetime value.
+				
 	Returns:
 	
-		An integer with the hour (0-1000000).
-	'''		
-	return long(parse_temporal(input_text).microsecond)
+		A tuple with a string for each part asked for, which is empty if that part is not valid.
 
-@outputSchema("microsecond:long")
-def tz_offset(input_text):
 	'''
-	Get the timezone offset for a particular temporal value.
+	if isinstance(date_parts, basestring):
+		date_parts = date_parts.split(',')
 
-	Parameters:
-	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
-	Returns:
-	
-		An string with the offset
-	'''		
-	return parse_temporal(input_text).strftime("%Z")
+	dt = parse_temporal(input_text)
 
-'''
-Returns the number of seconds since the epoch from this datetime.  This ported from Python.
+	if dt is None:
+		return None
 
-:param input_text:	text string with temporal values to be parsed and used.
-:return	long
-'''
-@outputSchema("seconds:long")
-def epoch(input_text):
+	result = []
+
+	for date_part in date_parts:
+		part = _DATE_PARTS.get(date_part.strip())
+
+		if part is None:
+			result.append('')
+		else:
+			result.append(str(_date_part_of(part, dt)))
+
+	return tuple(result)
+
+def _date_part_of(part, dt):
 	'''
-	Get the UNIX datetime for a particular temporal value.
+	Returns one part of a python datetime, given the full name of the part (see _DATE_PARTS).
+	'''
+	if part == 'year':
+		return dt.year
+	elif part == 'quarter':
+		return (dt.month-1)//3 + 1
+	elif part == 'month':
+		return dt.month
+	elif part == 'day_of_year' or part == 'day_name':
+		return _calendar_part(part, dt)
+	elif part == 'day':
+		return dt.day
+	elif part == 'week':
+		return _calendar_part('week', dt)
+	elif part == 'weekday' or part == 'day_of_week':
+		return _calendar_part('day_of_week', dt)
+	elif part == 'hour':
+		return dt.hour
+	elif part == 'minute':
+		return dt.minute
+	elif part == 'second':
+		return dt.second
+	elif part == 'microsecond':
+		return long(dt.microsecond)
+	elif part == 'epoch':
+		return _epoch_of(dt)
+	elif part == 'tz_offset':
+		return dt.strftime("%Z")
+	elif part == 'iso_week':
+		return dt.isocalendar()[1]
+	elif part == 'business_day':
+		return int(_default_business_calendar().is_business_day(dt))
+
+@outputSchema("part:chararray")
+def date_diff(date_part, start_text, end_text):
+	'''
+	Returns a character string representing the specific part of the difference between two specified datetimes.  While
+	it primarily parts out logic to other functions, everything returned from this function will
+	be formatted as a character string, making for more consistent handling.
+
+	Notes:
+	
+		(1) This is a useful function seen in T-SQL. See http://msdn.microsoft.com/en-us/library/ms189794.aspx for more details.
+
+	Usage:
+	
+		date_name('year', '1999-12-31 23:59:59') returns '1999'
+		date_name('month', '1999-12-31 23:59:59') returns '12'
+		date_name('day', '1999-12-31 23:59:59') returns '31'
+		date_name('day_name', '1999-12-31 23:59:59') returns 'friday'
+		date_name('day_of_week', '1999-12-31 23:59:59') returns '5'
 
 	Parameters:
 	
-		input_text: a string with a datetime value representing the temporal value to be manipulated.
-			
+		date_part: a text string containing an english name of the part that should be returned. This could be 
+		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
+		
+		start_text: a string with a datetime value representing the start of the period.
+		
+		end_text: a string with a datetime value representing the end of the period..
+				
 	Returns:
 	
-		A long with the number of seconds.
-	'''		
+		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+
+	'''
 	
-	return long((parse_temporal(input_text) - datetime(1970,1,1)).seconds)
+	start_dt = parse_temporal(start_text)
+	end_dt = parse_temporal(end_text)
+
+	if start_dt is None or end_dt is None:
+		return None
+
+	# this should be a positive number
+	delta = _date_difference(start_dt, end_dt)
+
+	if date_part == 'year' or date_part == 'yy' or date_part == 'yyyy':
+		return str(delta['years'])
+	elif date_part == 'quarter' or date_part == 'qq' or date_part == 'q':			
+		return str(((end_dt.year * 4) + _date_part_of('quarter', end_dt)) - ((start_dt.year * 4) + _date_part_of('quarter', start_dt)))
+	elif date_part == 'month' or date_part == 'mm' or date_part == 'm':
+		return str(delta['months'])
+	elif date_part == 'day' or date_part == 'dd' or date_part == 'd':
+		return str(delta['days'])
+	elif date_part == 'week' or date_part == 'wk' or date_part == 'ww':
+		return str(int(delta['days'] / 7.0))
+	elif date_part == 'hour' or date_part == 'hh':
+		return str(delta['hours'])
+	elif date_part == 'minute' or date_part == 'mi' or date_part == 'n':
+		return str(delta['minutes'])
+	elif date_part == 'second' or date_part == 'ss' or date_part == 's':
+		return str(delta['seconds'])
+	elif date_part == 'microsecond' or date_part == 'mcs':
+		return str(delta['microseconds'])
+	elif _DATE_PARTS.get(date_part) == 'business_day':
+		return str(_default_business_calendar().business_day_diff(start_dt, end_dt))
+	else:
+		return ''
+
+@outputSchema("part:chararray")
+def date_add(date_part, number, input_text):
+	'''
+	Returns a character string representing the the datetime with a certain number of units added to it. 
+
+	Notes:
+	
+		(1) This is a useful function seen in T-SQL. See http://msdn.microsoft.com/en-us/library/ms189794.aspx for more details.
+
+	Usage:
+	
+		date_add('year', 1, '1999-12-31 23:59:59') returns '2000-12-31 23:59:59'
+		date_add('year', -1, '1999-12-31 23:59:59') returns '1998-12-31 23:59:59'
+		date_add('quarter', 2, '1999-12-31 23:59:59') returns '2000-05-31 23:59:59'
+		date_add('month', 12, '1999-12-31 23:59:59') returns '2000-12-31 23:59:59'
+		date_add('second', -1, '1999-12-31 23:59:59') returns '1999-12-31 23:59:58'
+		date_add('bday', 1, '1999-12-31 23:59:59') returns '2000-01-03 23:59:59'
+
+	Parameters:
+
+		date_part: a text string containing an english name of the part that should be returned. This could be 
+		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
+		
+		number: the number to add to the datetime.  This can be positive or negative.
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+				
+	Returns:
+	
+		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+
+	'''	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	dt = _date_add_of(_DATE_PARTS.get(date_part), number, dt)
+
+	if dt is None:
+		return ''
+
+	return str(dt)
+
+def _date_add_of(part, number, dt):
+	'''
+	Returns a python datetime with number units of part added to it, or None if part can't be added.
+	'''
+	if part in _MICROSECONDS:
+		return dt + timedelta(microseconds=number * _MICROSECONDS[part])
+	elif part in _MONTHS:
+		return _add_months(dt, _MONTHS[part] * number)
+	elif part == 'business_day':
+		return _default_business_calendar().business_day_add(dt, number)
+	else:
+		return None
+
+@outputSchema("dt:chararray")
+def date_trunc(date_part, input_text):
+	'''
+	Truncates a datetime down to the unit specified. All precision below the date_part will be removed.
+
+	Notes:
+	
+		(1) This is a useful function seen in Oracle, Postgres, and others. See http://msdn.microsoft.com/en-us/library/ms189794.aspx for more details.
+
+	Usage:
+	
+		date_trunc('year', '1999-12-31 23:59:59') returns '1999-01-01 00:00:00'
+		date_trunc('quarter', '1999-12-31 23:59:59') returns '1999-10-01 00:00:00'
+		date_trunc('month', '1999-12-31 23:59:59') returns '1999-12-01 00:00:00'
+		date_trunc('day', '1999-12-31 23:59:59') returns '1999-12-31 00:00:00'
+		date_trunc('minute', '1999-12-31 23:59:59') returns '1999-12-31 23:59:00'
+		date_trunc('week', '1999-12-31 23:59:59') returns '1999-12-27 00:00:00'
+
+	Parameters:
+
+		date_part: a text string containing an english name of the part that should be returned. This could be 
+		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+				
+	Returns:
+	
+		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	dt = _date_trunc_of(_DATE_PARTS.get(date_part), dt)
+
+	if dt is None:
+		return ''
+
+	return str(dt)
+
+def _date_trunc_of(part, dt):
+	'''
+	Returns a python datetime truncated down to the start of part, or None if it can't be truncated to part.
+	'''
+	if part == 'year':
+		return dt.replace(month=1,day=1,hour=0, minute=0, second=0, microsecond=0)
+	elif part == 'quarter':
+		return dt.replace(month=(3*(_date_part_of('quarter', dt)-1))+1,day=1,hour=0, minute=0, second=0, microsecond=0)
+	elif part == 'month':
+		return dt.replace(day=1,hour=0, minute=0, second=0, microsecond=0)
+	elif part == 'week':
+		# weeks start on Monday, as they do for ISO weeks and week()
+		return dt - timedelta(days=dt.weekday(), 
+			microseconds=((dt.hour * 60 + dt.minute) * 60 + dt.second) * 1000000 + dt.microsecond)
+	elif part in _MICROSECONDS and part != 'microsecond':
+		time_of_day = ((dt.hour * 60 + dt.minute) * 60 + dt.second) * 1000000 + dt.microsecond
+		return dt - timedelta(microseconds=time_of_day % _MICROSECONDS[part])
+	else:
+		return None
+
+@outputSchema("dt:chararray")
+def date_start_of(date_part, input_text):
+	'''
+	A synonym for the date_trunc function.
+	
+	Parameters:
+
+		date_part: a text string containing an english name of the part that should be returned. This could be 
+		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
+		
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+	
+	Returns:
+		
+		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+
+	'''
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	dt = _date_trunc_of(_DATE_PARTS.get(date_part), dt)
+
+	if dt is None:
+		return ''
+
+	return str(dt)
+
+@outputSchema("dt:chararray")
+def date_end_of(date_part, input_text):
+	'''
+	Returns a datetime representing the last second of the time period containing the datetime specified.  
+
+	Usage:
+	
+		date_end_of('year', '1999-12-01 01:02:03') returns '1999-12-31 23:59:59'
+		date_end_of('quarter', '1999-12-31 23:59:59') returns '1999-12-31 23:59:59'
+		date_end_of('month', '1999-12-31 23:59:59') returns '1999-12-31 23:59:59'
+		date_end_of('day', '1999-12-31 23:59:59') returns '1999-12-31 23:59:59'
+		date_end_of('minute', '1999-12-31 23:59:59') returns '1999-12-31 23:59:59'
+
+		Notes:
+
+		(1) This can be combined nicely with the date_start_of function to isolate a range of values.
+	
+	Parameters:
+
+		date_part: a text string containing an english name of the part that should be returned. This could be 
+		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq' (see notes for a full list).
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+				
+	Returns:
+	
+		A string containing the particular part of the datetime (if valid) or an empty string (if invalid).
+
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	dt = _date_end_of(_DATE_PARTS.get(date_part), dt)
+
+	if dt is None:
+		return ''
+
+	return str(dt)
+
+def _date_end_of(part, dt):
+	'''
+	Returns a python datetime for the last second of the part containing dt, or None if part has no end.
+	'''
+	if part not in ('year', 'quarter', 'month', 'week', 'day', 'hour', 'minute'):
+		return None
+
+	# the start of the next period, less one second
+	return _date_add_of('second', -1, _date_trunc_of(part, _date_add_of(part, 1, dt)))
+
+# the recurrence rule frequency (and the number of them in one unit) for the units that vary in length
+_RRULE_FREQUENCIES = {
+	'year': ('YEARLY', 1),
+	'quarter': ('MONTHLY', 3),
+	'month': ('MONTHLY', 1),
+}
+
+def _series_start(part, start_text, step):
+	'''
+	Checks the arguments of a series, returning the start of the first period.
+	'''
+	if part is None or part == 'microsecond' or (part not in _MICROSECONDS and part not in _RRULE_FREQUENCIES):
+		raise ValueError("a series can't be made of '%s'" % (part,))
+
+	if step != int(step) or step < 1:
+		raise ValueError('step must be a whole number of at least 1, not %r' % (step,))
+
+	return _date_trunc_of(part, parse_temporal(start_text, 'raise'))
+
+def date_series(date_part, start_text, end_text, step=1, pairs=False, chunk_size=None):
+	'''
+	Generates the start of every period (of step units) from the period containing start_text up to 
+	end_text, such as every day of a month or every minute of a year, for calendar spines.  Values are 
+	made one at a time as they are asked for, so a spine of millions of minutes can be written out without
+	ever being held in memory.
+
+	Years, quarters and months come from dateutil's recurrence rules (rrule), and the fixed length units 
+	from adding the same timedelta again and again.
+
+	Usage:
+
+		for day in date_series('day', '2013-02-01', '2013-02-28'):
+			...
+
+		for start, end in date_series('hour', '2013-02-24', '2013-02-25', step=6, pairs=True):
+			...
+
+		for chunk in date_series('minute', '2013-01-01', '2014-01-01', chunk_size=10000):
+			output.writelines('%s\n' % minute for minute in chunk)
+
+	Parameters:
+
+		date_part: the units of the periods (year, quarter, month, week, day, hour, minute or second).
+		start_text: a temporal value in the first period.
+		end_text: the last temporal value that a period can start at.
+		step: the number of units in each period.
+		pairs: generate (start, end) tuples, where end is the last second of the period, like date_end_of().
+		chunk_size: generate lists of up to this many values instead of one value at a time.
+
+	Returns:
+
+		An iterator of python datetimes (or tuples of them, or lists of either).
+
+	'''
+	part = _DATE_PARTS.get(date_part)
+	start = _series_start(part, start_text, step)
+	series = _date_series(part, start, parse_temporal(end_text, 'raise'), int(step))
+
+	if pairs:
+		series = _series_pairs(part, series, int(step))
+
+	if chunk_size is None:
+		return series
+
+	return _series_chunks(series, chunk_size)
+
+def _date_series(part, start, end, step):
+	if part in _RRULE_FREQUENCIES:
+		frequency, months = _RRULE_FREQUENCIES[part]
+		return iter(rrule.rrule(getattr(rrule, frequency), dtstart=start, until=end, interval=months * step))
+
+	return _timedelta_series(start, end, timedelta(microseconds=_MICROSECONDS[part] * step))
+
+def _timedelta_series(start, end, delta):
+	while start <= end:
+		yield start
+		start += delta
+
+def _series_pairs(part, series, step):
+	second = timedelta(seconds=1)
+
+	for start in series:
+		yield start, _date_add_of(part, step, start) - second
+
+def _series_chunks(series, chunk_size):
+	chunk = []
+
+	for value in series:
+		chunk.append(value)
+
+		if len(chunk) >= chunk_size:
+			yield chunk
+			chunk = []
+
+	if chunk:
+		yield chunk
+
+@outputSchema("series:bag{t:tuple(dttm:chararray)}")
+def date_series_bag(date_part, start_text, end_text, step=1):
+	'''
+	Returns a bag with the start of every period from the period containing start_text up to end_text, 
+	to build a calendar spine in Pig without a loop of date_add() calls.
+
+	Usage:
+
+		spine = FOREACH one_row GENERATE FLATTEN(dttm.date_series_bag('day', '2013-01-01', '2013-12-31')) AS day;
+
+	Parameters:
+
+		date_part: the units of the periods (year, quarter, month, week, day, hour, minute or second).
+		start_text: a temporal value in the first period.
+		end_text: the last temporal value that a period can start at.
+		step: the number of units in each period.
+
+	Returns:
+
+		A bag of tuples, each holding an ISO formatted date time.
+
+	'''
+	start_dt = parse_temporal(start_text)
+	end_dt = parse_temporal(end_text)
+
+	if start_dt is None or end_dt is None:
+		return None
+
+	return [(str(start),) for start in date_series(date_part, start_dt, end_dt, step)]
+
+class TemporalExpression(object):
+	'''
+	A chain of date manipulations that is recorded first and run later, parsing each temporal value 
+	once, applying every step to the datetime, and formatting once at the end.  Nesting the functions 
+	directly, like date_add('day', -1, date_trunc('month', date_add('month', 1, ts))), formats and 
+	re-parses a string between every layer.
+
+	Each method returns a new expression with one more step, so expressions can be built up and shared.
+	The chain is compiled into a single function the first time the expression is used.
+
+	Usage:
+
+		end_of_month = TemporalExpression().date_add('month', 1).date_trunc('month').date_add('day', -1)
+		end_of_month('1999-12-15 10:00:00') returns '1999-12-31 00:00:00'
+		end_of_month.evaluate_many(timestamps)
+
+		TemporalExpression().date_trunc('quarter').date_name('day_name')('1999-12-15') returns 'Friday'
+
+	'''
+
+	def __init__(self, steps=(), finish=None, description=()):
+		self._steps = tuple(steps)
+		self._finish = finish
+		self._description = tuple(description)
+		self._compiled = None
+
+	def __repr__(self):
+		return 'TemporalExpression(%s)' % ' -> '.join(self._description)
+
+	@classmethod
+	def from_spec(cls, spec):
+		'''
+		Builds an expression from a text description, as used on the command line.  Steps are separated by
+		commas, and the arguments of each step by colons:
+
+			parse (or normalize)      the parsed value itself
+			date_add:<part>:<number>  add units, like date_add()
+			date_trunc:<part>         truncate, like date_trunc() (also date_start_of)
+			date_end_of:<part>        the end of the period, like date_end_of()
+			date_name:<part>          one part as a string, like date_name()
+			strftime:<format>         the value formatted with a strftime format
+			<part>                    one part as a number, for example year, quarter, iso_week or epoch
+
+		Usage:
+
+			TemporalExpression.from_spec('date_add:month:1,date_trunc:month,date_add:day:-1')
+			TemporalExpression.from_spec('date_trunc:hour,strftime:%Y%m%d%H')
+
+		'''
+		expr = cls()
+
+		for step in spec.split(','):
+			name, _, argument = step.strip().partition(':')
+
+			if name in ('parse', 'normalize'):
+				continue
+			elif name == 'date_add':
+				date_part, _, number = argument.partition(':')
+				expr = expr.date_add(date_part, float(number) if '.' in number else int(number))
+			elif name in ('date_trunc', 'date_start_of', 'date_end_of', 'date_name', 'strftime'):
+				expr = getattr(expr, name)(argument)
+			elif name in _DATE_PARTS:
+				expr = expr.date_part(name)
+			else:
+				raise ValueError("unknown step '%s' in '%s'" % (step, spec))
+
+		return expr
+
+	def _then(self, step, description):
+		if self._finish is not None:
+			raise ValueError('%r already ends by formatting its result' % (self,))
+
+		return TemporalExpression(self._steps + (step,), None, self._description + (description,))
+
+	def _ending(self, finish, description):
+		if self._finish is not None:
+			raise ValueError('%r already ends by formatting its result' % (self,))
+
+		return TemporalExpression(self._steps, finish, self._description + (description,))
+
+	def _part(self, date_part):
+		part = _DATE_PARTS.get(date_part)
+
+		if part is None:
+			raise ValueError("unknown date_part '%s'" % (date_part,))
+
+		return part
+
+	def date_add(self, date_part, number):
+		'''
+		Adds number units of date_part, like date_add().
+		'''
+		part = self._part(date_part)
+
+		if _date_add_of(part, 0, datetime(2000,1,1)) is None:
+			raise ValueError("date_part '%s' can't be added" % (date_part,))
+
+		return self._then(lambda dt: _date_add_of(part, number, dt), 'date_add(%r, %r)' % (date_part, number))
+
+	def date_trunc(self, date_part):
+		'''
+		Truncates down to the start of date_part, like date_trunc().
+		'''
+		part = self._part(date_part)
+
+		if _date_trunc_of(part, datetime(2000,1,1)) is None:
+			raise ValueError("date_part '%s' can't be truncated to" % (date_part,))
+
+		return self._then(lambda dt: _date_trunc_of(part, dt), 'date_trunc(%r)' % (date_part,))
+
+	def date_start_of(self, date_part):
+		'''
+		A synonym for date_trunc.
+		'''
+		return self.date_trunc(date_part)
+
+	def date_end_of(self, date_part):
+		'''
+		Moves to the last second of the date_part containing the value, like date_end_of().
+		'''
+		part = self._part(date_part)
+
+		if _date_end_of(part, datetime(2000,1,1)) is None:
+			raise ValueError("date_part '%s' has no end" % (date_part,))
+
+		return self._then(lambda dt: _date_end_of(part, dt), 'date_end_of(%r)' % (date_part,))
+
+	def date_name(self, date_part):
+		'''
+		Ends the expression by returning one part of the result as a string, like date_name().
+		'''
+		part = self._part(date_part)
+		return self._ending(lambda dt: str(_date_part_of(part, dt)), 'date_name(%r)' % (date_part,))
+
+	def date_part(self, date_part):
+		'''
+		Ends the expression by returning one part of the result as a number (or string for day_name and tz).
+		'''
+		part = self._part(date_part)
+		return self._ending(lambda dt: _date_part_of(part, dt), 'date_part(%r)' % (date_part,))
+
+	def strftime(self, output_format):
+		'''
+		Ends the expression by formatting the result with output_format.
+		'''
+		return self._ending(lambda dt: dt.strftime(output_format), 'strftime(%r)' % (output_format,))
+
+	def as_datetime(self):
+		'''
+		Ends the expression by returning the resulting python datetime without formatting it.
+		'''
+		return self._ending(lambda dt: dt, 'as_datetime()')
+
+	def compile(self):
+		'''
+		Returns a function that takes a temporal value and returns the result of the whole expression.
+		'''
+		if self._compiled is not None:
+			return self._compiled
+
+		from functools import partial
+
+		steps = self._steps
+		finish = self._finish or str
+
+		# failures are left to the caller, whatever the error policy is
+		parse = partial(parse_temporal, errors='raise')
+
+		if not steps:
+			evaluate = lambda input_text: finish(parse(input_text))
+		elif len(steps) == 1:
+			step = steps[0]
+			evaluate = lambda input_text: finish(step(parse(input_text)))
+		else:
+			def evaluate(input_text):
+				dt = parse(input_text)
+
+				for step in steps:
+					dt = step(dt)
+
+				return finish(dt)
+
+		self._compiled = evaluate
+		return evaluate
+
+	def __call__(self, input_text):
+		return self.compile()(input_text)
+
+	def evaluate_many(self, values):
+		'''
+		Returns a list with the result of the expression for each of the temporal values.
+		'''
+		evaluate = self.compile()
+		return [evaluate(value) for value in values]
+
+
+# ISO values that sort the same way as the times they hold: zero padded, naive, and written
+# without any extra whitespace ($ would let a trailing newline through)
+_SORTABLE_TEMPORAL = re.compile(r'\d{4}-\d\d-\d\d(?:[ T]\d\d:\d\d(?::\d\d(?:\.\d{1,6})?)?)?\Z')
+
+# the rest of a full sortable value, for padding out the shorter ones
+_SORTABLE_PADDING = '0000-00-00 00:00:00.000000'
+
+_PERIOD_PATTERNS = [
+	('year', re.compile(r'\s*(\d{4})\s*$')),
+	('month', re.compile(r'\s*(\d{4})-(\d{1,2})\s*$')),
+	('quarter', re.compile(r'\s*(\d{4})\s*-?\s*[Qq]([1-4])\s*$')),
+	('week', re.compile(r'\s*(\d{4})\s*-?\s*[Ww](\d{1,2})\s*$')),
+]
+
+def _sortable_key(dt):
+	'''
+	Returns the wall clock time of a python datetime as a full sortable ISO string.
+	'''
+	return '%04d-%02d-%02d %02d:%02d:%02d.%06d' % (dt.year, dt.month, dt.day, 
+		dt.hour, dt.minute, dt.second, dt.microsecond)
+
+def _period_start(part, period):
+	'''
+	Returns a python datetime for the start of the period of the given part that a period string names.
+	Besides any temporal value inside the period, years ('2013'), months ('2013-02'), quarters ('2013-Q1')
+	and ISO weeks ('2013-W06') can be given directly.
+	'''
+	if isinstance(period, basestring):
+		for shape, pattern in _PERIOD_PATTERNS:
+			m = pattern.match(period)
+
+			if m is None:
+				continue
+
+			year = int(m.group(1))
+
+			if shape == 'year':
+				start = datetime(year, 1, 1)
+			elif shape == 'month':
+				start = datetime(year, int(m.group(2)), 1)
+			elif shape == 'quarter':
+				start = datetime(year, 3*(int(m.group(2))-1) + 1, 1)
+			else:
+				# the Monday of ISO week 1 is the Monday on or before January 4th
+				january_4th = datetime(year, 1, 4)
+				start = january_4th + timedelta(days=7*(int(m.group(2))-1) - january_4th.weekday())
+
+			return _date_trunc_of(part, start)
+
+	return _date_trunc_of(part, parse_temporal(period, 'raise'))
+
+class TemporalPredicate(object):
+	'''
+	A test of whether temporal values fall within a range, for filtering.  The bounds are parsed once, 
+	and values in the regular ISO shape ("2013-02-24", "2013-02-24 18:15:44", "2013-02-24T18:15:44.5") 
+	are compared to them as strings, without being parsed.  Any other value is parsed with parse_temporal() 
+	and compared by its wall clock time, and the number of values that took each path is counted.
+
+	Values in the ISO shape aren't checked for being real dates, so "2013-02-30" is simply compared as
+	a string.  Use in_period() or between() to build predicates.
+
+	Usage:
+
+		first_quarter = in_period('quarter', '2013-Q1')
+		first_quarter('2013-02-24 18:15:44') returns True
+		first_quarter.filter(values)
+		first_quarter.stats()
+
+	Parameters:
+
+		start: the first temporal value in the range, or None for no lower bound.
+		end: the temporal value ending the range, or None for no upper bound.
+		inclusive: whether values equal to end are in the range.
+
+	'''
+
+	def __init__(self, start=None, end=None, inclusive=True):
+		self.start = start
+		self.end = end
+		self.inclusive = inclusive
+		self.fast_count = 0
+		self.slow_count = 0
+		self._start_key = None
+		self._end_key = None
+
+		if start is not None:
+			self._start_key = _sortable_key(parse_temporal(start, 'raise'))
+
+		if end is not None:
+			self._end_key = _sortable_key(parse_temporal(end, 'raise'))
+
+	def __repr__(self):
+		return 'TemporalPredicate(%r, %r, inclusive=%r)' % (self.start, self.end, self.inclusive)
+
+	def __call__(self, input_text):
+		if isinstance(input_text, basestring) and _SORTABLE_TEMPORAL.match(input_text) is not None:
+			self.fast_count += 1
+
+			if len(input_text) > 10 and input_text[10] == 'T':
+				input_text = input_text[:10] + ' ' + input_text[11:]
+
+			key = input_text + _SORTABLE_PADDING[len(input_text):]
+		else:
+			self.slow_count += 1
+			dt = parse_temporal(input_text)
+
+			if dt is None:
+				return None
+
+			key = _sortable_key(dt)
+
+		if self._start_key is not None and key < self._start_key:
+			return False
+
+		if self._end_key is not None:
+			if self.inclusive:
+				return key <= self._end_key
+			else:
+				return key < self._end_key
+
+		return True
+
+	def filter(self, values):
+		'''
+		Returns a list of the temporal values that are in the range.
+		'''
+		return [value for value in values if self(value)]
+
+	def stats(self):
+		'''
+		Returns a dictionary with the number of values compared as strings (fast) and parsed (slow).
+		'''
+		return {'fast': self.fast_count, 'slow': self.slow_count}
+
+def in_period(date_part, period):
+	'''
+	Returns a TemporalPredicate for the values within one year, quarter, month, week, day, hour, minute 
+	or second, the same as comparing the result of date_trunc() against the start of the period.
+
+	Usage:
+
+		in_period('year', '2013')
+		in_period('quarter', '2013-Q1')
+		in_period('month', '2013-02')
+		in_period('week', '2013-W06')
+		in_period('day', '2013-02-24')
+
+	Parameters:
+
+		date_part: the units of the period.
+		period: a year, month, quarter, ISO week, or any temporal value within the period.
+
+	'''
+	part = _DATE_PARTS.get(date_part)
+
+	if part not in ('year', 'quarter', 'month', 'week', 'day', 'hour', 'minute', 'second'):
+		raise ValueError("'%s' can't be used as a period" % (date_part,))
+
+	start = _period_start(part, period)
+
+	try:
+		end = _date_add_of(part, 1, start)
+	except (ValueError, OverflowError):
+		# the period runs to the end of time
+		end = None
+
+	return TemporalPredicate(start, end, inclusive=False)
+
+def between(start_text, end_text, inclusive=True):
+	'''
+	Returns a TemporalPredicate for the values from start_text up to end_text (including end_text itself
+	unless inclusive is False).  Either bound can be None to leave that side of the range open.
+
+	Usage:
+
+		between('2013-02-01', '2013-02-28 23:59:59')
+		between('2013-02-01', '2013-03-01', inclusive=False)
+		between('2013-02-01', None)
+
+	'''
+	return TemporalPredicate(start_text, end_text, inclusive)
+
+# predicates built for the Pig functions, by their arguments.  The bounds can come from a column, so only
+# the most recently used ones are kept.
+_predicates = TemporalCache(256)
+
+@outputSchema("in_period:boolean")
+def is_in_period(date_part, period, input_text):
+	'''
+	Returns whether a temporal value is within a period, building the test once for each period.  Regular
+	ISO values are tested without being parsed, which makes this cheaper than filtering on the extraction
+	functions when most of the values are well formed.
+
+	Usage:
+
+		this_qtr = FILTER dts BY dttm.is_in_period('quarter', '2013-Q1', timestamp);
+		this_mo = FILTER dts BY dttm.is_in_period('month', '2013-02', timestamp);
+
+	Parameters:
+
+		date_part: the units of the period.
+		period: a year, month ('2013-02'), quarter ('2013-Q1'), ISO week ('2013-W06'), or any temporal value within the period.
+		input_text: a string containing a datetime value.
+
+	Returns:
+
+		True if the value is within the period, and False otherwise.
+
+	'''
+	key = ('period', date_part, period)
+	predicate = _predicates.get(key)
+
+	if predicate is None:
+		predicate = in_period(date_part, period)
+		_predicates.put(key, predicate)
+
+	return predicate(input_text)
+
+@outputSchema("between:boolean")
+def is_between(start_text, end_text, input_text):
+	'''
+	Returns whether a temporal value is from start_text up to and including end_text.
+
+	Usage:
+
+		feb = FILTER dts BY dttm.is_between('2013-02-01', '2013-02-28 23:59:59', timestamp);
+
+	Parameters:
+
+		start_text: the first temporal value in the range.
+		end_text: the last temporal value in the range.
+		input_text: a string containing a datetime value.
+
+	Returns:
+
+		True if the value is in the range, and False otherwise.
+
+	'''
+	key = ('between', start_text, end_text)
+	predicate = _predicates.get(key)
+
+	if predicate is None:
+		predicate = between(start_text, end_text)
+		_predicates.put(key, predicate)
+
+	return predicate(input_text)
+
+class TemporalRollup(object):
+	'''
+	Counts, sums and finds the smallest and largest values of (timestamp, value) records in time buckets, 
+	the same as grouping by date_trunc(date_part, timestamp), as the records stream past.  Buckets are 
+	kept in a dictionary by their start, and a bucket is finished once the watermark (the latest timestamp 
+	seen, less the allowed lateness) passes its end.  ready() hands back the finished buckets and forgets 
+	them, so memory holds only the buckets still open.  Records that arrive for a bucket already handed 
+	back are counted as late and otherwise ignored.
+
+	Rollups of parts of a stream, for example from several worker processes, can be combined with merge().
+
+	Usage:
+
+		rollup = TemporalRollup('hour', lateness=300)
+
+		for timestamp, value in records:
+			rollup.add(timestamp, value)
+
+			for bucket in rollup.ready():
+				...
+
+		for bucket in rollup.flush():
+			...
+
+	Parameters:
+
+		date_part: the units of the buckets, any that date_trunc() accepts.
+		lateness: how far (in seconds, or as a timedelta) a record can be behind the latest timestamp seen
+			and still be counted in its bucket.
+
+	Returns:
+
+		Buckets are (start, count, sum, min, max) tuples, where start is a python datetime, in order of start.
+
+	'''
+
+	def __init__(self, date_part, lateness=0):
+		self.date_part = date_part
+		self.part = _DATE_PARTS.get(date_part)
+
+		if _date_trunc_of(self.part, _EPOCH) is None:
+			raise ValueError("'%s' can't be used for buckets" % (date_part,))
+
+		if isinstance(lateness, timedelta):
+			lateness = lateness.days * 86400 + lateness.seconds + lateness.microseconds / 1e6
+
+		self.lateness = int(lateness * 1000000)
+		self.buckets = {}
+		self.watermark = None
+		self.late_count = 0
+		self._latest = None
+		self._emitted_until = None
+		self._earliest_end = None
+
+		# fixed size buckets are found with arithmetic on the epoch, and weeks are shifted to start on
+		# Monday since 1970-01-01 was a Thursday
+		self._width = _MICROSECONDS.get(self.part)
+		self._shift = self.part == 'week' and 3 * _MICROSECONDS['day'] or 0
+
+	def __repr__(self):
+		return 'TemporalRollup(%r, open=%d, late=%d)' % (self.date_part, len(self.buckets), self.late_count)
+
+	def _bucket_of(self, micros):
+		'''
+		Returns the (start, end) of the bucket holding a time, in microseconds since the epoch.
+		'''
+		if self._width is not None:
+			start = micros - (micros + self._shift) % self._width
+			return start, start + self._width
+
+		start = _date_trunc_of(self.part, _from_micros(micros))
+		return _to_micros(start), _to_micros(_date_add_of(self.part, 1, start))
+
+	def add(self, timestamp, value=None):
+		'''
+		Adds a record to its bucket.  A value of None is counted without being summed.  Returns False if 
+		the record was late, and True otherwise.
+		'''
+		micros = _to_micros(parse_temporal(timestamp, 'raise'))
+
+		if self._latest is None or micros > self._latest:
+			self._latest = micros
+			self.watermark = micros - self.lateness
+
+		if self._emitted_until is not None and micros < self._emitted_until:
+			self.late_count += 1
+			return False
+
+		start, end = self._bucket_of(micros)
+		bucket = self.buckets.get(start)
+
+		if bucket is None:
+			bucket = self.buckets[start] = [0, 0, None, None, end]
+
+			if self._earliest_end is None or end < self._earliest_end:
+				self._earliest_end = end
+
+		bucket[0] += 1
+
+		if value is not None:
+			bucket[1] += value
+
+			if bucket[2] is None or value < bucket[2]:
+				bucket[2] = value
+
+			if bucket[3] is None or value > bucket[3]:
+				bucket[3] = value
+
+		return True
+
+	def add_many(self, records):
+		'''
+		Adds (timestamp, value) records, returning a list of the buckets finished along the way.
+		'''
+		finished = []
+
+		for timestamp, value in records:
+			self.add(timestamp, value)
+
+			if self._earliest_end is not None and self.watermark >= self._earliest_end:
+				finished.extend(self.ready())
+
+		return finished
+
+	def _take(self, starts):
+		starts.sort()
+		finished = []
+
+		for start in starts:
+			count, total, smallest, largest, end = self.buckets.pop(start)
+			finished.append((_from_micros(start), count, total, smallest, largest))
+
+			if self._emitted_until is None or end > self._emitted_until:
+				self._emitted_until = end
+
+		self._earliest_end = None
+
+		for bucket in self.buckets.itervalues():
+			if self._earliest_end is None or bucket[4] < self._earliest_end:
+				self._earliest_end = bucket[4]
+
+		return finished
+
+	def ready(self):
+		'''
+		Returns the buckets that the watermark has passed, removing them from the rollup.
+		'''
+		if self._earliest_end is None or self.watermark < self._earliest_end:
+			return []
+
+		watermark = self.watermark
+		return self._take([start for start, bucket in self.buckets.iteritems() if bucket[4] <= watermark])
+
+	def flush(self):
+		'''
+		Returns every bucket still open, finished or not, removing them from the rollup.
+		'''
+		return self._take(self.buckets.keys())
+
+	def merge(self, other):
+		'''
+		Adds the open buckets and late counts of another rollup of the same units into this one.  Buckets 
+		that either rollup has already handed back are not opened again: their records are counted as 
+		late, the same as records added after their bucket was handed back.
+		'''
+		if other.part != self.part:
+			raise ValueError("can't merge '%s' buckets into '%s' buckets" % (other.date_part, self.date_part))
+
+		if other._emitted_until is not None and (self._emitted_until is None or other._emitted_until > self._emitted_until):
+			self._emitted_until = other._emitted_until
+
+		emitted_until = self._emitted_until
+
+		for start, (count, total, smallest, largest, end) in other.buckets.iteritems():
+			if emitted_until is not None and start < emitted_until:
+				self.late_count += count
+				continue
+
+			bucket = self.buckets.get(start)
+
+			if bucket is None:
+				self.buckets[start] = [count, total, smallest, largest, end]
+				continue
+
+			bucket[0] += count
+			bucket[1] += total
+
+			if smallest is not None and (bucket[2] is None or smallest < bucket[2]):
+				bucket[2] = smallest
+
+			if largest is not None and (bucket[3] is None or largest > bucket[3]):
+				bucket[3] = largest
+
+		# buckets of this rollup that the other one already handed back
+		if emitted_until is not None:
+			for start in [start for start in self.buckets if start < emitted_until]:
+				self.late_count += self.buckets.pop(start)[0]
+
+		self._earliest_end = None
+
+		for bucket in self.buckets.itervalues():
+			if self._earliest_end is None or bucket[4] < self._earliest_end:
+				self._earliest_end = bucket[4]
+
+		self.late_count += other.late_count
+
+		if other._latest is not None and (self._latest is None or other._latest > self._latest):
+			self._latest = other._latest
+			self.watermark = other._latest - self.lateness
+
+		return self
+
+def _bag_temporal(t, field, row):
+	'''
+	Returns the datetime in one field of a tuple from a Pig bag, or None if there isn't one that can be 
+	parsed.  A bad value never fails the bag, but under the 'quarantine' policy it is kept in the quarantine
+	with the position of the tuple in the bag as the row.
+	'''
+	try:
+		value = t[field]
+	except (IndexError, TypeError):
+		# a null tuple, or one without the field
+		return None
+
+	if value is None:
+		return None
+
+	try:
+		dt = _lookup_temporal(value)
+	except TypeError, error:
+		# a value that can't be a cache key
+		dt = _Rejected(error)
+
+	if dt.__class__ is _Rejected:
+		return _reject(value, dt.error, _error_policy == 'quarantine' and 'quarantine' or 'null', row)
+
+	return dt
+
+def _bag_temporals(bag, field):
+	'''
+	Yields (tuple, datetime) for each tuple in a Pig bag whose field holds a temporal value that can be 
+	parsed, skipping the rest.
+	'''
+	if bag is None:
+		return
+
+	for row, t in enumerate(bag):
+		dt = _bag_temporal(t, field, row)
+
+		if dt is not None:
+			yield t, dt
+
+@outputSchema("dttms:bag{t:tuple(dttm:chararray)}")
+def bag_parse(bag, field=0):
+	'''
+	Parses the temporal value of every tuple in a bag, crossing from Pig into Python once for the whole
+	bag rather than once per tuple.  Values that can't be parsed come back as nulls, so one bad value 
+	doesn't fail the bag.
+
+	Usage:
+
+		by_user = GROUP events BY user;
+		FOREACH by_user GENERATE group, dttm.bag_parse(events.timestamp);
+
+	Parameters:
+
+		bag: a bag of tuples.
+		field: the position of the temporal value in each tuple (defaults to the first).
+
+	Returns:
+
+		A bag with a tuple holding the ISO formatted date time (or null) for each tuple in the bag.
+
+	'''
+	result = []
+
+	for row, t in enumerate(bag or []):
+		dt = _bag_temporal(t, field, row)
+		result.append((dt is not None and str(dt) or None,))
+
+	return result
+
+@outputSchema("parts:bag{t:tuple()}")
+def bag_date_parts(date_parts, bag, field=0):
+	'''
+	Returns the date_parts() of every tuple in a bag, parsing each value once and crossing into Python 
+	once for the whole bag.  Values that can't be parsed get a tuple of nulls.
+
+	Usage:
+
+		FOREACH by_user GENERATE group, dttm.bag_date_parts('yy,mm,dd', events.timestamp);
+
+	Parameters:
+
+		date_parts: a comma separated string of the parts that should be returned, as for date_parts().
+		bag: a bag of tuples.
+		field: the position of the temporal value in each tuple (defaults to the first).
+
+	Returns:
+
+		A bag with a tuple of parts, formatted as strings, for each tuple in the bag.
+
+	'''
+	if isinstance(date_parts, basestring):
+		date_parts = date_parts.split(',')
+
+	parts = [_DATE_PARTS.get(date_part.strip()) for date_part in date_parts]
+	missing = (None,) * len(parts)
+	result = []
+
+	for row, t in enumerate(bag or []):
+		dt = _bag_temporal(t, field, row)
+
+		if dt is None:
+			result.append(missing)
+			continue
+
+		result.append(tuple([part is not None and str(_date_part_of(part, dt)) or '' for part in parts]))
+
+	return result
+
+def _bag_extreme(bag, field, latest):
+	'''
+	Returns (tuple, datetime) for the earliest (or latest) temporal value in a bag, or (None, None) for an empty bag.
+	'''
+	best, best_dt = None, None
+
+	for t, dt in _bag_temporals(bag, field):
+		if best_dt is None or (latest and dt > best_dt) or (not latest and dt < best_dt):
+			best, best_dt = t, dt
+
+	return best, best_dt
+
+@outputSchema("dttm:chararray")
+def bag_min(bag, field=0):
+	'''
+	Returns the earliest temporal value in a bag, ignoring values that can't be parsed.
+
+	Usage:
+
+		FOREACH by_user GENERATE group, dttm.bag_min(events.timestamp) AS first_seen;
+
+	Returns:
+
+		A string containing an ISO formatted date time, or null if the bag has no temporal values.
+
+	'''
+	t, dt = _bag_extreme(bag, field, False)
+	return dt is not None and str(dt) or None
+
+@outputSchema("dttm:chararray")
+def bag_max(bag, field=0):
+	'''
+	Returns the latest temporal value in a bag, ignoring values that can't be parsed.
+
+	Usage:
+
+		FOREACH by_user GENERATE group, dttm.bag_max(events.timestamp) AS last_seen;
+
+	Returns:
+
+		A string containing an ISO formatted date time, or null if the bag has no temporal values.
+
+	'''
+	t, dt = _bag_extreme(bag, field, True)
+	return dt is not None and str(dt) or None
+
+@outputSchema("first:tuple()")
+def bag_first(bag, field=0):
+	'''
+	Returns the whole tuple with the earliest temporal value in a bag, such as the first event of a user.
+
+	Usage:
+
+		FOREACH by_user GENERATE group, FLATTEN(dttm.bag_first(events, 1));
+
+	Parameters:
+
+		bag: a bag of tuples.
+		field: the position of the temporal value in each tuple (defaults to the first).
+
+	Returns:
+
+		The tuple, or null if the bag has no temporal values.
+
+	'''
+	return _bag_extreme(bag, field, False)[0]
+
+@outputSchema("last:tuple()")
+def bag_last(bag, field=0):
+	'''
+	Returns the whole tuple with the latest temporal value in a bag, such as the last event of a user.
+
+	Usage:
+
+		FOREACH by_user GENERATE group, FLATTEN(dttm.bag_last(events, 1));
+
+	Returns:
+
+		The tuple, or null if the bag has no temporal values.
+
+	'''
+	return _bag_extreme(bag, field, True)[0]
+
+@outputSchema("buckets:bag{t:tuple(bucket:chararray, count:long)}")
+def bag_bucket_counts(date_part, bag, field=0):
+	'''
+	Counts the temporal values in a bag by date_trunc(date_part, value), in one call for the whole bag
+	instead of a date_trunc() per tuple followed by a nested GROUP.
+
+	Usage:
+
+		FOREACH by_user GENERATE group, dttm.bag_bucket_counts('day', events.timestamp);
+
+	Parameters:
+
+		date_part: the units to count by, any that date_trunc() accepts.
+		bag: a bag of tuples.
+		field: the position of the temporal value in each tuple (defaults to the first).
+
+	Returns:
+
+		A bag of (bucket, count) tuples in order of bucket, where bucket is the start of the period.
+
+	'''
+	rollup = TemporalRollup(date_part)
+
+	for t, dt in _bag_temporals(bag, field):
+		rollup.add(dt)
+
+	return [(str(start), count) for start, count, total, smallest, largest in rollup.flush()]
+				
+@outputSchema("dttm:chararray")
+def today():
+	'''
+	A function to return today's date.  This can be combined nicely with date_add for ranges.
+
+	Parameters:
+				
+	Returns:
+	
+		A string containing todays date.
+
+	'''	
+	
+	return str(date.today())
+
+
+@outputSchema("dttm:chararray")
+def now():
+	'''
+	A function to return the current date and time.  This can be combined nicely with date_add for ranges.
+
+	Parameters:
+				
+	Returns:
+	
+		A string containing the date and time when this function was called.
+
+	'''	
+	
+	return str(datetime.now())
+
+		
+@outputSchema("year:int")
+def year(input_text):
+	'''
+	Get the year for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the year.
+	'''	
+
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return dt.year
+	
+@outputSchema("month:int")
+def month(input_text):
+	'''
+	Get the month for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the month (1-12).
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return int(dt.month)
+	
+@outputSchema("day_of_year:int")
+def day_of_year(input_text):
+	'''
+	Get the day of the year for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the day of the year (1-366).
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return _calendar_part('day_of_year', dt)
+
+@outputSchema("day:int")
+def day(input_text):
+	'''
+	Get the day for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the day (1-31).
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return int(dt.day)
+
+@outputSchema("quarter:int")
+def quarter(input_text):
+	'''
+	Get the quarter for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the quarter (1-4).
+	'''	
+
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return (dt.month-1)//3 + 1
+
+@outputSchema("week:int")
+def week(input_text):
+	'''
+	Get the week of the year for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the week (1-52).
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return _calendar_part('week', dt)
+
+@outputSchema("week:int")
+def iso_week(input_text):
+	'''
+	Get the ISO defined week of the year for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the week (1-53).
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return int(dt.isocalendar()[1])
+
+@outputSchema("weekday:chararray")
+def day_name(input_text):
+	'''
+	Get the day of the week as text for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An string with the text name of the day of the week.
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return _calendar_part('day_name', dt)
+
+@outputSchema("day_of_week:int")
+def day_of_week(input_text):
+	'''
+	Get the numeric day of the week for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the week (1-7).
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return _calendar_part('day_of_week', dt)
+
+@outputSchema("hour:int")
+def hour(input_text):
+	'''
+	Get the numeric hour of the day for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the hour (0-23).
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return int(dt.hour)
+
+@outputSchema("minute:int")
+def minute(input_text):
+	'''
+	Get the numeric minute of the hour for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the hour (0-59).
+	'''	
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return int(dt.minute)
+
+@outputSchema("second:int")
+def second(input_text):
+	'''
+	Get the numeric second of the minute for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the second (0-59).
+	'''		
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return int(dt.second)
+
+@outputSchema("microsecond:long")
+def microsecond(input_text):
+	'''
+	Get the numeric microsoecond for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An integer with the hour (0-1000000).
+	'''		
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return long(dt.microsecond)
+
+@outputSchema("microsecond:long")
+def tz_offset(input_text):
+	'''
+	Get the timezone offset for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		An string with the offset
+	'''		
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return dt.strftime("%Z")
+
+'''
+Returns the number of seconds since the epoch from this datetime.  This ported from Python.
+
+:param input_text:	text string with temporal values to be parsed and used.
+:return	long
+'''
+@outputSchema("seconds:long")
+def epoch(input_text):
+	'''
+	Get the UNIX datetime for a particular temporal value.
+
+	Parameters:
+	
+		input_text: a string with a datetime value representing the temporal value to be manipulated.
+			
+	Returns:
+	
+		A long with the number of seconds.
+	'''		
+	
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return _epoch_of(dt)
+
+def _epoch_of(dt):
+	return long(_epoch_micros(dt) // 1000000)
+
+def _epoch_micros(dt):
+	'''
+	Returns microseconds since 1970-01-01 00:00:00 UTC for a python datetime, taking naive values as UTC.
+	'''
+	offset = dt.utcoffset()
+
+	if offset:
+		dt = dt - offset
+
+	return _to_micros(dt)
+
+# tzinfo objects by the names they were asked for, and transition tables by the id of their tzinfo
+_timezones = {}
+_timezone_tables = {}
+
+_DAY_MICROS = 86400 * 1000000
+
+def _timezone(zone):
+	'''
+	Returns a tzinfo for a time zone name ('America/New_York', 'UTC', 'local', 'EST5EDT', ...), looking each
+	name up in the time zone database only once.  A tzinfo is returned as it is.
+	'''
+	if not isinstance(zone, basestring):
+		return zone
+
+	tzinfo = _timezones.get(zone)
+
+	if tzinfo is None:
+		if zone.upper() in ('UTC', 'Z', 'GMT'):
+			tzinfo = tz.tzutc()
+		elif zone.lower() == 'local':
+			tzinfo = tz.tzlocal()
+		else:
+			tzinfo = tz.gettz(zone)
+
+		if tzinfo is None:
+			raise ValueError("unknown time zone '%s'" % (zone,))
+
+		_timezones[zone] = tzinfo
+
+	return tzinfo
+
+class TimezoneTable(object):
+	'''
+	The UTC offsets of a time zone over the years covered by the calendar tables (see calendar_table_range()), 
+	as a sorted list of the UTC times at which the offset changes.  Finding the offset for a time is then
+	a binary search, rather than a query of the time zone database.  Times outside of the years covered 
+	ask the tzinfo directly.
+
+	Transitions are found by checking the offset and name of the zone once a week and narrowing each 
+	change down to the second, so changes of name alone (EWT to EPT) are kept too, but a zone that 
+	changes and back again within one week isn't represented exactly.
+
+	Parameters:
+
+		tzinfo: the time zone.
+
+	'''
+
+	def __init__(self, tzinfo):
+		self.tzinfo = tzinfo
+		self.start = _to_micros(datetime(CALENDAR_START_YEAR, 1, 1))
+		self.end = _to_micros(datetime(CALENDAR_END_YEAR + 1, 1, 1))
+
+		state = self._probe(self.start)
+		self.transitions = [self.start]
+		self.offsets = [state[0]]
+		self.zones = [self._zone(*state)]
+
+		previous = self.start
+
+		for week in xrange(self.start + 7 * _DAY_MICROS, self.end + 7 * _DAY_MICROS, 7 * _DAY_MICROS):
+			week = min(week, self.end - 1000000)
+
+			if self._probe(week) == state:
+				previous = week
+				continue
+
+			# narrow the change down to the second
+			low, high = previous // 1000000, week // 1000000
+
+			while high - low > 1:
+				middle = (low + high) // 2
+
+				if self._probe(middle * 1000000) == state:
+					low = middle
+				else:
+					high = middle
+
+			state = self._probe(high * 1000000)
+			self.transitions.append(high * 1000000)
+			self.offsets.append(state[0])
+			self.zones.append(self._zone(*state))
+			previous = week
+
+	def __repr__(self):
+		return 'TimezoneTable(%r, transitions=%d)' % (self.tzinfo, len(self.transitions))
+
+	def _probe(self, micros):
+		'''
+		Asks the tzinfo for the (offset in microseconds, name) of the zone at a UTC time.
+		'''
+		local = self.tzinfo.fromutc(_from_micros(micros, self.tzinfo))
+		offset = local.utcoffset()
+		return (offset.days * 86400 + offset.seconds) * 1000000, local.tzname()
+
+	def _zone(self, offset, name):
+		'''
+		Returns a fixed offset tzinfo with the name the zone uses for it, shared between all the tables.
+		'''
+		key = (name, offset)
+		tzinfo = _tzoffsets.get(key)
+
+		if tzinfo is None:
+			tzinfo = _tzoffsets[key] = tz.tzoffset(name, offset // 1000000)
+
+		return tzinfo
+
+	def position(self, micros):
+		'''
+		Returns the position in the table of the offset in effect at a UTC time, or None if it isn't covered.
+		'''
+		if micros < self.start or micros >= self.end:
+			return None
+
+		return bisect.bisect_right(self.transitions, micros) - 1
+
+	def offset_at(self, micros):
+		'''
+		Returns the UTC offset in microseconds in effect at a UTC time, given in microseconds.
+		'''
+		i = self.position(micros)
+
+		if i is None:
+			return self._probe(micros)[0]
+
+		return self.offsets[i]
+
+	def to_local(self, micros):
+		'''
+		Returns the python datetime for a UTC time (in microseconds), in the zone, with a fixed offset tzinfo.
+		'''
+		i = self.position(micros)
+
+		if i is None:
+			offset, name = self._probe(micros)
+			return _from_micros(micros + offset, self._zone(offset, name))
+
+		return _from_micros(micros + self.offsets[i], self.zones[i])
+
+	def local_offset(self, local_micros):
+		'''
+		Returns the UTC offset in microseconds of a wall clock time in the zone.  A time that happens twice,
+		when the clocks go back, is taken as the first of the two, and a time skipped when the clocks go
+		forward is taken with the offset from before the change.
+		'''
+		before = self.offset_at(local_micros - _DAY_MICROS)
+
+		if self.offset_at(local_micros - before) == before:
+			return before
+
+		after = self.offset_at(local_micros + _DAY_MICROS)
+
+		if self.offset_at(local_micros - after) == after:
+			return after
+
+		return before
+
+def _timezone_table(zone):
+	'''
+	Returns the TimezoneTable for a time zone, building it the first time the zone is used.
+	'''
+	tzinfo = _timezone(zone)
+
+	# not every tzinfo can be hashed, but the table keeps its tzinfo (and so its id) alive
+	table = _timezone_tables.get(id(tzinfo))
+
+	if table is None:
+		table = _timezone_tables[id(tzinfo)] = TimezoneTable(tzinfo)
+
+	return table
+
+@outputSchema("dttm:chararray")
+def to_timezone(input_text, zone):
+	'''
+	Converts a temporal value to the wall clock time of a time zone.  Values without an offset are taken 
+	to be in UTC.
+
+	Usage:
+
+		to_timezone('2013-02-24 18:15:44', 'America/New_York') returns '2013-02-24 13:15:44-05:00'
+		to_timezone('2013-07-04 12:00:00+02:00', 'Asia/Kolkata') returns '2013-07-04 15:30:00+05:30'
+
+	Parameters:
+
+		input_text: a string containing a datetime value.
+		zone: the name of a time zone, such as 'Europe/Paris', 'UTC' or 'local'.
+
+	Returns:
+
+		A python datetime (if called from Python) or a string containing an ISO formatted date time (if called from Pig).
+
+	'''
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	return _timezone_table(zone).to_local(_epoch_micros(dt))
+
+@outputSchema("dttm:chararray")
+def from_timezone(input_text, zone):
+	'''
+	Converts a wall clock time in a time zone to UTC.  Values that already have an offset are converted
+	using their own offset.
+
+	Usage:
+
+		from_timezone('2013-02-24 13:15:44', 'America/New_York') returns '2013-02-24 18:15:44+00:00'
+
+	Parameters:
+
+		input_text: a string containing a datetime value.
+		zone: the name of the time zone the value is in.
+
+	Returns:
+
+		A python datetime in UTC (if called from Python) or a string containing an ISO formatted date time (if called from Pig).
+
+	'''
+	dt = parse_temporal(input_text)
+
+	if dt is None:
+		return None
+
+	micros = _to_micros(dt)
+
+	if dt.tzinfo is None:
+		micros -= _timezone_table(zone).local_offset(micros)
+	else:
+		micros = _epoch_micros(dt)
+
+	return _from_micros(micros, _timezone('UTC'))
+
+# The metrics registry, which is None (and costs nothing) until enable_metrics() is called.
+_metrics = None
+
+# The functions whose calls are counted while metrics are enabled.  parse_temporal() isn't in the list
+# because every parse, direct or not, is already recorded in the parse section of the metrics.
+_INSTRUMENTED_FUNCTIONS = [
+	'temporal_from_parts', 'parse_formatted_temporal', 'date_name', 'date_parts', 'date_diff', 'date_add',
+	'date_trunc', 'date_start_of', 'date_end_of', 'today', 'now', 'year', 'month', 'day_of_year', 'day',
+	'quarter', 'week', 'iso_week', 'day_name', 'day_of_week', 'hour', 'minute', 'second', 'microsecond',
+	'tz_offset', 'epoch', 'is_in_period', 'is_between', 'to_timezone', 'from_timezone', 'bag_parse', 
+	'bag_date_parts', 'bag_min', 'bag_max', 'bag_first', 'bag_last', 'bag_bucket_counts', 'date_series_bag',
+	'business_day_add', 'business_day_diff', 'is_business_day',
+]
+
+# the originals of the functions replaced while metrics are enabled
+_uninstrumented = {}
+
+class TemporalMetrics(object):
+	'''
+	Counts what the library is doing: calls per function (and per date_part for the functions that take
+	one), failures per function, and for every parse, how long it took and whether it came from the
+	cache, the fast path, or the fuzzy parser.
+
+	Parse latencies are kept as a histogram with power of two buckets in microseconds, so recording one
+	costs a couple of integer operations and the histogram stays small.
+
+	Use enable_metrics() rather than creating one of these directly.
+	'''
+
+	def __init__(self):
+		self.reset()
+		self.pig_counters = False
+		self._reported = {}
+		self._unreported_calls = 0
+
+	def reset(self):
+		self.calls = {}
+		self.failures = {}
+		self.parses = 0
+		self.fresh_parses = 0
+		self.fuzzy_parses = 0
+		self.parse_failures = 0
+		self.latency_histogram = {}
+
+	def parse(self, input_text):
+		'''
+		Does the work of parse_temporal() while recording the path taken and the time it took.  Returns a 
+		datetime, or a _Rejected for a value that can't be parsed.
+		'''
+		start = _timer()
+
+		try:
+			dt = _parse_cache.get(input_text)
+
+			if dt is None:
+				self.fresh_parses += 1
+				dt = _parse_fresh(input_text)
+				_parse_cache.put(input_text, dt)
+
+			if dt.__class__ is _Rejected:
+				self.parse_failures += 1
+		except:
+			self.parse_failures += 1
+			raise
+		finally:
+			self.parses += 1
+
+			# the bucket is the number of bits in the latency in microseconds: 0 is under 1us, 1 is 1us, 2 is 2-3us, ...
+			bucket = int((_timer() - start) * 1000000).bit_length()
+			self.latency_histogram[bucket] = self.latency_histogram.get(bucket, 0) + 1
+
+		return dt
+
+	def call(self, name, function, arguments, keywords):
+		'''
+		Calls function, counting the call under its name (and date_part) and counting it as a failure if it raises.
+		'''
+		calls = self.calls
+		calls[name] = calls.get(name, 0) + 1
+
+		if name in _DATE_PART_FUNCTIONS:
+			if arguments:
+				date_part = arguments[0]
+			else:
+				date_part = keywords.get('date_part', keywords.get('date_parts'))
+
+			if date_part is not None:
+				key = '%s:%s' % (name, date_part)
+				calls[key] = calls.get(key, 0) + 1
+
+		try:
+			return function(*arguments, **keywords)
+		except:
+			self.failures[name] = self.failures.get(name, 0) + 1
+			raise
+		finally:
+			if self.pig_counters:
+				self._unreported_calls += 1
+
+				if self._unreported_calls >= 10000:
+					metrics_to_pig_counters()
+
+	def snapshot(self):
+		'''
+		Returns a dictionary with a copy of all of the metrics.
+		'''
+		histogram = {}
+
+		for bucket, count in self.latency_histogram.items():
+			if bucket == 0:
+				label = '<1us'
+			elif bucket == 1:
+				label = '1us'
+			else:
+				label = '%d-%dus' % (1 << (bucket-1), (1 << bucket) - 1)
+			histogram[label] = count
+
+		cache = parse_cache_stats()
+		lookups = cache['hits'] + cache['misses']
+
+		return {
+			'calls': dict(self.calls),
+			'failures': dict(self.failures),
+			'parse': {
+				'count': self.parses,
+				'cached': self.parses - self.fresh_parses,
+				'fast': self.fresh_parses - self.fuzzy_parses,
+				'fuzzy': self.fuzzy_parses,
+				'failures': self.parse_failures,
+				'slow_path_ratio': float(self.fuzzy_parses) / self.parses if self.parses else 0.0,
+				'latency_histogram': histogram,
+			},
+			'cache': cache,
+			'cache_hit_rate': float(cache['hits']) / lookups if lookups else 0.0,
+		}
+
+# the functions whose first argument is a date_part, which are also counted per date_part
+_DATE_PART_FUNCTIONS = set(['date_name', 'date_parts', 'date_diff', 'date_add', 'date_trunc', 'date_start_of', 'date_end_of',
+	'is_in_period', 'bag_date_parts', 'bag_bucket_counts', 'date_series_bag'])
+
+_timer = time.time
+
+def _instrument(function):
+	'''
+	Returns a function that calls function, counting its calls in the metrics.  It carries the name,
+	documentation and attributes (such as the Pig schema) of function.
+	'''
+	name = function.__name__
+
+	def instrumented(*arguments, **keywords):
+		metrics = _metrics
+
+		if metrics is None:
+			return function(*arguments, **keywords)
+
+		return metrics.call(name, function, arguments, keywords)
+
+	instrumented.__name__ = name
+	instrumented.__doc__ = function.__doc__
+	instrumented.__dict__.update(function.__dict__)
+	return instrumented
+
+def enable_metrics(pig_counters=False):
+	'''
+	Starts collecting metrics.  Until this is called nothing is recorded, and the library runs exactly as
+	it would without metrics.  Call counts work by replacing the public functions of this module with 
+	counting versions, so in Pig, metrics need to be turned on when the file is registered by setting the 
+	DTTM_METRICS environment variable for the tasks (to 1, or to 'pig' to also update Pig counters).
+
+	Usage:
+
+		enable_metrics()
+		... 
+		metrics_snapshot()
+
+	Parameters:
+
+		pig_counters: also add the counts to Pig counters (in the 'dttm' group) as the task goes.
+
+	'''
+	global _metrics
+
+	if _metrics is None:
+		_metrics = TemporalMetrics()
+
+	_metrics.pig_counters = pig_counters
+	module = globals()
+
+	for name in _INSTRUMENTED_FUNCTIONS:
+		if name not in _uninstrumented:
+			_uninstrumented[name] = module[name]
+			module[name] = _instrument(module[name])
+
+def disable_metrics():
+	'''
+	Stops collecting metrics and puts the original functions back.  The metrics collected so far are discarded.
+	'''
+	global _metrics
+
+	_metrics = None
+	globals().update(_uninstrumented)
+	_uninstrumented.clear()
+
+def metrics_snapshot():
+	'''
+	Returns a dictionary with the metrics collected so far, or None if metrics are not enabled.
+	'''
+	if _metrics is None:
+		return None
+
+	return _metrics.snapshot()
+
+def metrics_reset():
+	'''
+	Sets all of the metrics (and the parse cache counters) back to zero.
+	'''
+	if _metrics is not None:
+		_metrics.reset()
+		_metrics._reported = {}
+
+	_parse_cache.hits = _parse_cache.misses = _parse_cache.evictions = 0
+
+def metrics_dump(path):
+	'''
+	Writes the metrics collected so far to a file as JSON.
+	'''
+	import json
+
+	output = open(path, 'w')
+
+	try:
+		json.dump(metrics_snapshot(), output, indent=2, sort_keys=True)
+	finally:
+		output.close()
+
+def metrics_to_pig_counters(group='dttm'):
+	'''
+	Adds the metrics collected since the last time this was called to Pig counters in group.  This only
+	does something when running inside a Pig task, and returns False otherwise.
+	'''
+	if _metrics is None:
+		return False
+
+	try:
+		from org.apache.pig.tools.pigstats import PigStatusReporter
+	except ImportError:
+		return False
+
+	reporter = PigStatusReporter.getInstance()
+
+	if reporter is None:
+		return False
+
+	snapshot = _metrics.snapshot()
+	counts = {}
+
+	for name, count in snapshot['calls'].items():
+		counts['calls.' + name] = count
+
+	for name, count in snapshot['failures'].items():
+		counts['failures.' + name] = count
+
+	for name in ('count', 'cached', 'fast', 'fuzzy', 'failures'):
+		counts['parse.' + name] = snapshot['parse'][name]
+
+	_metrics._unreported_calls = 0
+
+	for name, count in counts.items():
+		delta = count - _metrics._reported.get(name, 0)
+
+		if delta:
+			counter = reporter.getCounter(group, name)
+
+			if counter is not None:
+				counter.increment(delta)
+
+			_metrics._reported[name] = count
+
+	return True
+
+# A value that numpy can convert to a datetime64 by itself, and that means the same thing to parse_temporal().
+# numpy accepts the year 0000, which a python datetime can't hold, so that is left to parse_temporal().
+_NUMPY_TEMPORAL = re.compile(r'(?!0000)\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?)?\Z')
+
+def _require_numpy():
+	global numpy
+
+	if numpy is None:
+		try:
+			import numpy
+		except ImportError:
+			raise ImportError('numpy is required for the batch (*_many) functions')
+
+def parse_temporal_many(values, errors='null'):
+	'''
+	Parses a whole list (or array) of temporal values at once, returning a numpy datetime64[us] array and
+	a boolean array marking which of the values could be parsed.
+
+	Well-formed ISO 8601 values are converted by numpy in a single step, and only the rest are parsed one
+	at a time with parse_temporal().  Values that can't be parsed at all are NaT in the result and False
+	in the mask instead of raising an exception, so a few bad rows don't stop the batch.  With the 
+	'quarantine' error policy they are also kept in the quarantine, with their position as the row.
+
+	Usage:
+
+		dts, valid = parse_temporal_many(['1999-12-31 23:59:59', '12/31/1999', 'garbage'])
+		dts, valid = parse_temporal_many(timestamps, errors='quarantine')
+
+	Notes:
+
+		(1) This function needs numpy, and is meant for offline jobs in CPython rather than for Pig.
+
+		(2) numpy datetimes do not have a time zone, so values with an offset keep their local time
+		and the offset is dropped.  This matches what the extraction functions (year(), hour(), ...) 
+		return for them, although epoch() takes the offset into account and the batch epoch doesn't.
+
+	Parameters:
+
+		values: a sequence of temporal values.
+		errors: the error policy, 'null' (the default, whatever the module's policy is), 'quarantine' or 'raise'.
+
+	Returns:
+
+		A tuple of a numpy datetime64[us] array and a numpy boolean array, both as long as values.
+
+	'''
+	_require_numpy()
+
+	values = list(values)
+	result = numpy.empty(len(values), dtype='M8[us]')
+	result[:] = numpy.datetime64('NaT')
+	valid = numpy.zeros(len(values), dtype=bool)
+
+	clean_rows = []
+	clean_values = []
+	match = _NUMPY_TEMPORAL.match
+
+	for i, value in enumerate(values):
+		if isinstance(value, basestring) and match(value):
+			clean_rows.append(i)
+			clean_values.append(value)
+			continue
+
+		try:
+			dt = _lookup_temporal(value)
+		except TypeError, error:
+			# a value that can't be a cache key
+			dt = _Rejected(error)
+
+		if dt.__class__ is _Rejected:
+			_reject(value, dt.error, errors, i)
+			continue
+
+		result[i] = numpy.datetime64(dt.replace(tzinfo=None), 'us')
+		valid[i] = True
+
+	if clean_rows:
+		try:
+			result[clean_rows] = numpy.array(clean_values, dtype='M8[us]')
+			valid[clean_rows] = True
+		except ValueError:
+			# one of them was out of range (2013-02-30), so convert them one by one
+			for i, value in zip(clean_rows, clean_values):
+				dt = _lookup_temporal(value)
+
+				if dt.__class__ is _Rejected:
+					_reject(value, dt.error, errors, i)
+					continue
+
+				result[i] = numpy.datetime64(dt, 'us')
+				valid[i] = True
+
+	return result, valid
+
+def _datetime64_part(date_part, dts):
+	'''
+	Returns a numpy integer array with one part of each value of a datetime64[us] array.
+	'''
+	part = _DATE_PARTS.get(date_part)
+	dts = dts.astype('M8[us]')
+	days = dts.astype('M8[D]')
+
+	if part == 'year':
+		return dts.astype('M8[Y]').astype(numpy.int64) + 1970
+	elif part == 'quarter':
+		return (dts.astype('M8[M]').astype(numpy.int64) % 12) // 3 + 1
+	elif part == 'month':
+		return dts.astype('M8[M]').astype(numpy.int64) % 12 + 1
+	elif part == 'day':
+		return (days - dts.astype('M8[M]').astype('M8[D]')).astype(numpy.int64) + 1
+	elif part == 'day_of_year':
+		return (days - dts.astype('M8[Y]').astype('M8[D]')).astype(numpy.int64) + 1
+
+	# Monday is 0, and 1970-01-01 was a Thursday
+	weekday = (days.astype(numpy.int64) + 3) % 7
+
+	if part == 'weekday' or part == 'day_of_week':
+		return weekday + 1
+	elif part == 'business_day':
+		calendar = _default_business_calendar()
+		ordinals = days.astype(numpy.int64) + _EPOCH_ORDINAL
+		weekend = numpy.in1d(weekday, list(calendar.weekend)) | numpy.in1d(ordinals, list(calendar.holidays))
+		return (~weekend).astype(numpy.int64)
+	elif part == 'week':
+		# the same as strftime('%W'), where days before the first Monday of the year are in week 0
+		day_of_year = (days - dts.astype('M8[Y]').astype('M8[D]')).astype(numpy.int64)
+		return (day_of_year + 7 - weekday) // 7
+	elif part == 'iso_week':
+		# ISO weeks belong to the year that their Thursday falls in
+		thursday = days + (3 - weekday).astype('m8[D]')
+		return (thursday - thursday.astype('M8[Y]').astype('M8[D]')).astype(numpy.int64) // 7 + 1
+
+	time_of_day = (dts - days).astype(numpy.int64)
+
+	if part == 'hour':
+		return time_of_day // 3600000000
+	elif part == 'minute':
+		return time_of_day // 60000000 % 60
+	elif part == 'second':
+		return time_of_day // 1000000 % 60
+	elif part == 'microsecond':
+		return time_of_day % 1000000
+	elif part == 'epoch':
+		return dts.astype(numpy.int64) // 1000000
+	else:
+		raise ValueError("date_part '%s' can't be computed for an array" % (date_part,))
+
+def date_part_many(date_part, values):
+	'''
+	Returns one numeric part of every temporal value in a list or array, using the same date_part 
+	names as date_name().  This is the batch equivalent of year(), quarter(), month(), day(), iso_week(), 
+	etc., evaluated with numpy over the whole batch at once.
+
+	Usage:
+
+		years, valid = date_part_many('year', ['1999-12-31 23:59:59', '2/1/2000'])
+		weeks, valid = date_part_many('iso_wk', dts)
+
+	Parameters:
+
+		date_part: a text string containing an english name of the part that should be returned. This could be 
+		something like 'year' or 'hour' or an abbreviation like 'wk' or 'qq'.  Parts that aren't numbers 
+		(day_name and tz) are not supported, and business_day uses the default calendar, the same as
+		date_name().
+
+		values: a sequence of temporal values, or a numpy datetime64 array (such as one returned by 
+		parse_temporal_many()).
+
+	Returns:
+
+		A tuple of a numpy integer array with the parts and a numpy boolean array marking the valid values.
+		The parts of invalid values are meaningless.
+
+	'''
+	_require_numpy()
+
+	dts, valid = _as_datetime64(values)
+	return _datetime64_part(date_part, dts), valid
+
+_MIN_MICROS = _to_micros(datetime.min)
+_MAX_MICROS = _to_micros(datetime.max)
+
+def _as_datetime64(values):
+	'''
+	Returns (datetime64[us] array, valid mask) for a sequence of temporal values or a datetime64 array.
+	'''
+	if isinstance(values, numpy.ndarray) and values.dtype.kind == 'M':
+		return values.astype('M8[us]'), ~numpy.isnat(values)
+
+	return parse_temporal_many(values)
+
+def _micros_many(values):
+	'''
+	Returns (int64 microseconds since the epoch, valid mask) for temporal values, with invalid values as 0 
+	so that arithmetic on them can't overflow.
+	'''
+	dts, valid = _as_datetime64(values)
+	return numpy.where(valid, dts.view(numpy.int64), 0), valid
+
+def _from_micros_many(micros, valid):
+	'''
+	Returns (datetime64[us] array, valid mask) for microseconds since the epoch, where results outside the 
+	years python datetimes can hold (1 to 9999) are invalid (and NaT), as they would raise an error for one value.
+	'''
+	valid = valid & (micros >= _MIN_MICROS) & (micros <= _MAX_MICROS)
+	return numpy.where(valid, micros.view('M8[us]'), numpy.datetime64('NaT', 'us')), valid
+
+def _month_parts_many(micros):
+	'''
+	Returns (months since 1970-01, zero based day of the month, microseconds into the day) for each time.
+	'''
+	days = micros // _DAY_MICROS
+	months = micros.view('M8[us]').astype('M8[M]').astype(numpy.int64)
+	day_of_month = days - months.view('M8[M]').astype('M8[D]').astype(numpy.int64)
+
+	return months, day_of_month, micros - days * _DAY_MICROS
+
+def _add_months_many(micros, months):
+	'''
+	The batch equivalent of _add_months(), keeping the day unless the new month is too short.
+	'''
+	month, day_of_month, time_of_day = _month_parts_many(micros)
+	target = month + months
+	first_day = target.view('M8[M]').astype('M8[D]').astype(numpy.int64)
+	days_in_month = (target + 1).view('M8[M]').astype('M8[D]').astype(numpy.int64) - first_day
+
+	return (first_day + numpy.minimum(day_of_month, days_in_month - 1)) * _DAY_MICROS + time_of_day
+
+def _date_add_micros(part, number, micros):
+	'''
+	Returns microseconds with number (a scalar or an array) units of part added, the same as _date_add_of().
+	'''
+	number = numpy.asarray(number)
+
+	if part in _MICROSECONDS:
+		if number.dtype.kind in 'iub':
+			return micros + number.astype(numpy.int64) * _MICROSECONDS[part]
+
+		# timedelta rounds fractions of a microsecond to the nearest, with ties to even
+		return micros + numpy.round(number * _MICROSECONDS[part]).astype(numpy.int64)
+	elif part in _MONTHS:
+		if number.dtype.kind not in 'iub' and numpy.any(number != numpy.floor(number)):
+			raise ValueError('months must be a whole number, not %r' % (number,))
+
+		return _add_months_many(micros, number.astype(numpy.int64) * _MONTHS[part])
+	else:
+		return None
+
+def _date_trunc_micros(part, micros):
+	'''
+	Returns microseconds truncated down to the start of part, the same as _date_trunc_of().
+	'''
+	if part == 'year':
+		return micros.view('M8[us]').astype('M8[Y]').astype('M8[us]').view(numpy.int64)
+	elif part == 'quarter':
+		months = micros.view('M8[us]').astype('M8[M]').astype(numpy.int64)
+		return (months - months % 3).view('M8[M]').astype('M8[us]').view(numpy.int64)
+	elif part == 'month':
+		return micros.view('M8[us]').astype('M8[M]').astype('M8[us]').view(numpy.int64)
+	elif part == 'week':
+		# weeks start on Monday, and 1970-01-01 was a Thursday
+		return micros - (micros + 3 * _DAY_MICROS) % _MICROSECONDS['week']
+	elif part in _MICROSECONDS and part != 'microsecond':
+		return micros - micros % _MICROSECONDS[part]
+	else:
+		return None
+
+def date_add_many(date_part, number, values):
+	'''
+	Adds a number of units to every temporal value in a list or array at once, the batch equivalent of 
+	date_add().  Months, quarters and years are added with integer arithmetic on the month, keeping the
+	day of the month unless the new month is too short, the same as date_add().
+
+	Usage:
+
+		tomorrow, valid = date_add_many('day', 1, dts)
+		shifted, valid = date_add_many('month', numpy.array([1, -1, 12]), dts)
+
+	Parameters:
+
+		date_part: the units to add, as for date_add().
+		number: the number of units, either one number for every value or an array with one for each value.
+		values: a sequence of temporal values, or a numpy datetime64 array.
+
+	Returns:
+
+		A tuple of a numpy datetime64[us] array and a numpy boolean array marking the valid results.
+
+	'''
+	_require_numpy()
+
+	part = _DATE_PARTS.get(date_part)
+
+	if part not in _MICROSECONDS and part not in _MONTHS:
+		raise ValueError("date_part '%s' can't be added to an array" % (date_part,))
+
+	micros, valid = _micros_many(values)
+	return _from_micros_many(_date_add_micros(part, number, micros), valid)
+
+def date_trunc_many(date_part, values):
+	'''
+	Truncates every temporal value in a list or array down to the start of a unit at once, the batch 
+	equivalent of date_trunc().  Weeks start on Monday.
+
+	Usage:
+
+		days, valid = date_trunc_many('day', dts)
+
+	Parameters:
+
+		date_part: the units to truncate to, as for date_trunc().
+		values: a sequence of temporal values, or a numpy datetime64 array.
+
+	Returns:
+
+		A tuple of a numpy datetime64[us] array and a numpy boolean array marking the valid results.
+
+	'''
+	_require_numpy()
+
+	part = _DATE_PARTS.get(date_part)
+	micros, valid = _micros_many(values)
+	truncated = _date_trunc_micros(part, micros)
+
+	if truncated is None:
+		raise ValueError("an array can't be truncated to '%s'" % (date_part,))
+
+	return _from_micros_many(truncated, valid)
+
+def date_start_of_many(date_part, values):
+	'''
+	The batch equivalent of date_start_of(), which is the same as date_trunc_many().
+	'''
+	return date_trunc_many(date_part, values)
+
+def date_end_of_many(date_part, values):
+	'''
+	Returns the last second of the unit containing every temporal value in a list or array, the batch 
+	equivalent of date_end_of().
+
+	Usage:
+
+		month_ends, valid = date_end_of_many('month', dts)
+
+	Parameters:
+
+		date_part: one of year, quarter, month, week, day, hour or minute (or their abbreviations).
+		values: a sequence of temporal values, or a numpy datetime64 array.
+
+	Returns:
+
+		A tuple of a numpy datetime64[us] array and a numpy boolean array marking the valid results.
+
+	'''
+	_require_numpy()
+
+	part = _DATE_PARTS.get(date_part)
+
+	if part not in ('year', 'quarter', 'month', 'week', 'day', 'hour', 'minute'):
+		raise ValueError("an array has no end of '%s'" % (date_part,))
+
+	micros, valid = _micros_many(values)
+
+	# the start of the next period, less one second
+	ends = _date_trunc_micros(part, _date_add_micros(part, 1, micros)) - _MICROSECONDS['second']
+	return _from_micros_many(ends, valid)
+
+def date_diff_many(date_part, start_values, end_values):
+	'''
+	Returns the difference between pairs of temporal values in lists or arrays at once, the batch 
+	equivalent of date_diff().  As with date_diff(), each unit is one part of the difference broken down
+	into years, months, days, hours, minutes, seconds and microseconds (so the 'day' difference between
+	January 1st and March 3rd is 2), except for quarters and weeks.
+
+	Usage:
+
+		days, valid = date_diff_many('day', starts, ends)
+
+	Parameters:
+
+		date_part: the units of the difference, as for date_diff().
+		start_values, end_values: sequences of temporal values, or numpy datetime64 arrays, of the same length.
+
+	Returns:
+
+		A tuple of a numpy integer array and a numpy boolean array marking the valid results.
+
+	'''
+	_require_numpy()
+
+	part = _DATE_PARTS.get(date_part)
+	start, start_valid = _micros_many(start_values)
+	end, end_valid = _micros_many(end_values)
+	valid = start_valid & end_valid
+
+	start_month = start.view('M8[us]').astype('M8[M]').astype(numpy.int64)
+	end_month = end.view('M8[us]').astype('M8[M]').astype(numpy.int64)
+
+	if part == 'quarter':
+		return numpy.where(valid, end_month // 3 - start_month // 3, 0), valid
+
+	if part not in ('year', 'month', 'week', 'day', 'hour', 'minute', 'second', 'microsecond'):
+		raise ValueError("date_part '%s' can't be used to compare arrays" % (date_part,))
+
+	# the whole number of months, less one where the day and time mean the last month isn't complete
+	months = end_month - start_month
+	anchor = _add_months_many(start, months)
+	forward = end >= start
+	months = months - (forward & (end < anchor)) + (~forward & (end > anchor))
+	delta = end - _add_months_many(start, months)
+
+	if part == 'year' or part == 'month':
+		sign = numpy.where(months < 0, -1, 1)
+		years, months = numpy.divmod(months * sign, 12)
+
+		if part == 'year':
+			result = years * sign
+		else:
+			result = months * sign
+	elif part == 'microsecond':
+		result = delta % 1000000
+	else:
+		seconds = delta // 1000000
+		sign = numpy.where(seconds < 0, -1, 1)
+		seconds = seconds * sign
+
+		if part == 'day' or part == 'week':
+			result = seconds // 86400
+		elif part == 'hour':
+			result = seconds // 3600 % 24
+		elif part == 'minute':
+			result = seconds // 60 % 60
+		else:
+			result = seconds % 60
+
+		if part == 'week':
+			result = result // 7
+
+		result = result * sign
+
+	return numpy.where(valid, result, 0), valid
+
+def date_series_many(date_part, start_text, end_text, step=1):
+	'''
+	Returns the start of every period from the period containing start_text up to end_text as a numpy
+	datetime64[us] array, the same values as date_series() generates, computed all at once.
+
+	Usage:
+
+		minutes = date_series_many('minute', '2013-01-01', '2013-12-31 23:59')
+
+	'''
+	_require_numpy()
+
+	part = _DATE_PARTS.get(date_part)
+	start = _series_start(part, start_text, step)
+	end = _to_micros(parse_temporal(end_text, 'raise'))
+	step = int(step)
+
+	if part in _RRULE_FREQUENCIES:
+		months = _MONTHS[part] * step
+		first = (start.year - 1970) * 12 + start.month - 1
+		last = numpy.datetime64(_from_micros(end), 'M').astype(numpy.int64)
+		series = numpy.arange(first, last + 1, months).view('M8[M]').astype('M8[us]')
+		return series[series.view(numpy.int64) <= end]
+
+	return numpy.arange(_to_micros(start), end + 1, _MICROSECONDS[part] * step).view('M8[us]')
+
+def _timezone_offsets_many(table, micros, valid):
+	'''
+	Returns a numpy array of the UTC offsets (in microseconds) in effect at an array of UTC times.  The
+	offsets of the times that aren't valid are 0.
+	'''
+	transitions = numpy.array(table.transitions, dtype='i8')
+	offsets = numpy.array(table.offsets, dtype='i8')
+	covered = (micros >= table.start) & (micros < table.end)
+	result = offsets[numpy.maximum(numpy.searchsorted(transitions, micros, 'right') - 1, 0)]
+	result[~valid] = 0
+
+	for i in numpy.flatnonzero(valid & ~covered):
+		# times a day either side of the first or last datetime are asked about when converting from a zone, and
+		# dateutil can't work out the offset of a time closer than a day to either end
+		result[i] = table.offset_at(min(max(int(micros[i]), _MIN_MICROS + _DAY_MICROS), _MAX_MICROS - _DAY_MICROS))
+
+	return result
+
+def to_timezone_many(values, zone):
+	'''
+	Converts a whole list (or array) of temporal values to the wall clock time of a time zone, finding the 
+	offset of every value in the zone's transition table at once.  Values without an offset are taken to be 
+	in UTC, as for to_timezone().
+
+	Usage:
+
+		local, valid = to_timezone_many(dts, 'Europe/Paris')
+
+	Parameters:
+
+		values: a sequence of temporal values, or a numpy datetime64 array (in UTC).
+		zone: the name of a time zone.
+
+	Returns:
+
+		A tuple of a numpy datetime64[us] array of wall clock times, without an offset since numpy datetimes 
+		don't carry one, and a numpy boolean array marking the valid values.
+
+	'''
+	_require_numpy()
+
+	if isinstance(values, numpy.ndarray) and values.dtype.kind == 'M':
+		dts, valid = values.astype('M8[us]'), ~numpy.isnat(values)
+		micros = numpy.where(valid, dts.view('i8'), 0)
+	else:
+		micros = numpy.zeros(len(values), dtype='i8')
+		valid = numpy.zeros(len(values), dtype=bool)
+
+		for i, value in enumerate(values):
+			try:
+				micros[i] = _epoch_micros(parse_temporal(value, 'raise'))
+				valid[i] = True
+			except (ValueError, OverflowError, TypeError, AttributeError):
+				pass
+
+	local = micros + _timezone_offsets_many(_timezone_table(zone), micros, valid)
+	return numpy.where(valid, local.view('M8[us]'), numpy.datetime64('NaT', 'us')), valid
+
+def from_timezone_many(values, zone):
+	'''
+	Converts a whole list (or array) of wall clock times in a time zone to UTC, the batch equivalent of 
+	from_timezone().  Values that already have an offset are converted using their own offset.
+
+	Usage:
+
+		utc, valid = from_timezone_many(dts, 'America/New_York')
+
+	Parameters:
+
+		values: a sequence of temporal values, or a numpy datetime64 array of wall clock times.
+		zone: the name of the time zone the values are in.
+
+	Returns:
+
+		A tuple of a numpy datetime64[us] array in UTC and a numpy boolean array marking the valid values.
+
+	'''
+	_require_numpy()
+
+	table = _timezone_table(zone)
+
+	if isinstance(values, numpy.ndarray) and values.dtype.kind == 'M':
+		dts, valid = values.astype('M8[us]'), ~numpy.isnat(values)
+		local, aware = numpy.where(valid, dts.view('i8'), 0), numpy.zeros(len(values), dtype=bool)
+	else:
+		local = numpy.zeros(len(values), dtype='i8')
+		valid = numpy.zeros(len(values), dtype=bool)
+		aware = numpy.zeros(len(values), dtype=bool)
+
+		for i, value in enumerate(values):
+			try:
+				dt = parse_temporal(value, 'raise')
+				aware[i] = dt.tzinfo is not None
+
+				if aware[i]:
+					local[i] = _epoch_micros(dt)
+				else:
+					local[i] = _to_micros(dt)
+
+				valid[i] = True
+			except (ValueError, OverflowError, TypeError, AttributeError):
+				pass
+
+	# the same choice between the offsets before and after a change as TimezoneTable.local_offset()
+	before = _timezone_offsets_many(table, local - _DAY_MICROS, valid)
+	after = _timezone_offsets_many(table, local + _DAY_MICROS, valid)
+	use_after = (_timezone_offsets_many(table, local - before, valid) != before) & \
+		(_timezone_offsets_many(table, local - after, valid) == after)
+	utc = local - numpy.where(use_after, after, before)
+	utc = numpy.where(aware, local, utc)
+
+	return numpy.where(valid, utc.view('M8[us]'), numpy.datetime64('NaT', 'us')), valid
+
+def _transform_lines(lines, expressions, column=0, delimiter='\t', replace=False, errors='blank'):
+	'''
+	Applies compiled expressions to one column of delimited lines, yielding the output lines.  The results 
+	are appended to the end of each record, or put in place of the column if replace is set.
+
+	When a value can't be parsed, errors decides what happens: 'blank' writes empty results, 'skip' drops 
+	the record, and 'fail' raises the exception.
+	'''
+	for line in lines:
+		record = line.rstrip('\r\n').split(delimiter)
+
+		try:
+			results = [str(evaluate(record[column])) for evaluate in expressions]
+		except (ValueError, OverflowError, TypeError, AttributeError, IndexError):
+			if errors == 'fail':
+				raise
+			elif errors == 'skip':
+				continue
+
+			results = [''] * len(expressions)
+
+		if replace and column < len(record):
+			record[column:column+1] = results
+		else:
+			record.extend(results)
+
+		yield delimiter.join(record) + '\n'
+
+def _write_buffered(output, lines, buffer_lines=4096):
+	'''
+	Writes lines to output in blocks of buffer_lines, rather than one write per line, and returns the 
+	number of lines written.
+	'''
+	block = []
+	count = 0
+
+	for line in lines:
+		block.append(line)
+
+		if len(block) >= buffer_lines:
+			output.write(''.join(block))
+			count += len(block)
+			del block[:]
+
+	if block:
+		output.write(''.join(block))
+		count += len(block)
+
+	return count
+
+# A naive ISO 8601 value filling a whole field, matched directly against the bytes of a memory-mapped file.
+_ISO_FIELD = re.compile(r'(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6})\d*)?)?)?\r?$')
+
+def scan_temporal_file(path, column=None, delimiter='\t', start=0, end=None):
+	'''
+	Reads a file of temporal values through a memory map, yielding the byte offset of each line and the 
+	python datetime parsed from it (or None if it couldn't be parsed).
+
+	Lines aren't copied into strings: the fields are found in the mapped bytes, and ISO 8601 values are 
+	matched in place, so only the digits of each field are converted.  Just the values that need the fuzzy 
+	parser are copied out and given to parse_temporal().
+
+	Usage:
+
+		for offset, dt in scan_temporal_file('dates'):
+			...
+
+		for offset, dt in scan_temporal_file('events.csv', column=2, delimiter=','):
+			...
+
+	Parameters:
+
+		path: the file to read.
+		column: the zero based field holding the temporal value, or None if each line is just the value.
+		delimiter: the field delimiter.
+		start, end: the byte range to scan, which should begin at the start of a line (defaults to the whole file).
+
+	Returns:
+
+		An iterator of (offset, datetime) tuples.
+
+	'''
+	import mmap
+
+	input_file = open(path, 'rb')
+
+	try:
+		size = os.fstat(input_file.fileno()).st_size
+
+		if end is None or end > size:
+			end = size
+
+		if start >= end:
+			return
+
+		mm = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+	finally:
+		input_file.close()
+
+	match = _ISO_FIELD.match
+	find = mm.find
+
+	try:
+		pos = start
+
+		while pos < end:
+			line_end = find('\n', pos, end)
+
+			if line_end == -1:
+				line_end = end
+
+			field_start, field_end = pos, line_end
+
+			if column is not None:
+				for i in xrange(column):
+					field_start = find(delimiter, field_start, line_end)
+
+					if field_start == -1:
+						break
+
+					field_start += len(delimiter)
+
+				if field_start == -1:
+					yield pos, None
+					pos = line_end + 1
+					continue
+
+				field_end = find(delimiter, field_start, line_end)
+
+				if field_end == -1:
+					field_end = line_end
+
+			m = match(mm, field_start, field_end)
+			dt = None
+
+			if m is not None:
+				year, month, day, hour, minute, second, fraction = m.groups()
+				dt = _build_temporal(int(year), int(month), int(day), hour, minute, second, fraction)
+
+			if dt is None:
+				try:
+					dt = parse_temporal(mm[field_start:field_end].rstrip('\r'), 'raise')
+				except (ValueError, OverflowError, TypeError, AttributeError):
+					dt = None
+
+			yield pos, dt
+			pos = line_end + 1
+	finally:
+		mm.close()
+
+# the array typecode for 64 bit integers, found the first time it is needed
+_int64_typecode = None
+
+def _int64_array(values=()):
+	'''
+	Returns an array of 64 bit integers.  Python 2 has no 'q' typecode, but 'l' is 64 bits wide on most
+	platforms (and on Jython).
+	'''
+	import array
+
+	global _int64_typecode
+
+	if _int64_typecode is None:
+		for typecode in ('q', 'l'):
+			try:
+				if array.array(typecode).itemsize == 8:
+					_int64_typecode = typecode
+					break
+			except ValueError:
+				pass
+		else:
+			raise ValueError("this platform has no array typecode for 64 bit integers")
+
+	return array.array(_int64_typecode, values)
+
+class TemporalIndex(object):
+	'''
+	A sorted index of the temporal values in a file, kept in a sidecar file next to it, for answering 
+	range and period queries without reading the whole file.  The index holds the epoch (in microseconds) 
+	of every row that could be parsed, in order, with the byte offset of each row, so a query is two 
+	binary searches followed by reading just the matching rows.
+
+	When rows are appended to the file, update() indexes only the new ones.  If the file has been 
+	rewritten rather than appended to, update() rebuilds the index instead.
+
+	The sidecar is a 64 byte header followed by the epochs and then the offsets, both as little-endian 
+	64 bit integers.  Values with a time zone are placed by their UTC time, the same as epoch() does.
+
+	Usage:
+
+		index = TemporalIndex.open('dates')
+		index.offsets('2013-02-01', '2013-02-28 23:59:59')
+		for offset, line in index.rows(index.period_offsets('month', '2013-02')):
+			...
+		index.update()
+
+	Parameters:
+
+		path: the file to index.
+		column: the zero based field holding the temporal value, or None if each line is just the value.
+		delimiter: the field delimiter.
+		index_path: where to keep the index, defaults to the path with '.dttmidx' added.
+
+	'''
+
+	MAGIC = 'DTTMIDX1'
+
+	# magic, bytes indexed, bytes in complete lines, rows, crc of the first block, column, delimiter
+	HEADER = '<8sqqqii24s'
+
+	# the number of bytes at the start of the file that are checked for changes
+	CHECKED_BYTES = 4096
+
+	def __init__(self, path, column=None, delimiter='\t', index_path=None):
+		self.path = path
+		self.column = column
+		self.delimiter = delimiter
+		self.index_path = index_path or path + '.dttmidx'
+		self.epochs = _int64_array()
+		self.offsets_array = _int64_array()
+		self.indexed_bytes = 0
+		self.complete_bytes = 0
+		self.checksum = 0
+
+	def __repr__(self):
+		return 'TemporalIndex(%r, rows=%d)' % (self.path, len(self))
+
+	def __len__(self):
+		return len(self.epochs)
+
+	@classmethod
+	def open(cls, path, column=None, delimiter='\t', index_path=None):
+		'''
+		Returns the index of a file, loading it if the sidecar exists and building it otherwise.  A loaded 
+		index is brought up to date with any rows added to the file since it was saved.
+		'''
+		index = cls(path, column, delimiter, index_path)
+
+		if os.path.exists(index.index_path):
+			index.load()
+			index.update()
+		else:
+			index.build()
+
+		return index
+
+	def _checksum(self):
+		import zlib
+
+		input_file = open(self.path, 'rb')
+
+		try:
+			return zlib.crc32(input_file.read(min(self.CHECKED_BYTES, self.indexed_bytes)))
+		finally:
+			input_file.close()
+
+	def _scan(self, start):
+		'''
+		Indexes the rows from byte start to the end of the file, returning a sorted list of (epoch, offset).
+		'''
+		import mmap
+
+		self.indexed_bytes = os.path.getsize(self.path)
+		self.complete_bytes = self.indexed_bytes
+		entries = []
+
+		if self.indexed_bytes > start:
+			input_file = open(self.path, 'rb')
+
+			try:
+				mm = mmap.mmap(input_file.fileno(), self.indexed_bytes, access=mmap.ACCESS_READ)
+			finally:
+				input_file.close()
+
+			try:
+				if mm[self.indexed_bytes - 1] != '\n':
+					# the last line may still be being written, so it's indexed again on the next update
+					self.complete_bytes = max(start, mm.rfind('\n', start, self.indexed_bytes) + 1)
+			finally:
+				mm.close()
+
+			# rows appended after the size was taken are left for the next update
+			for offset, dt in scan_temporal_file(self.path, self.column, self.delimiter, start, self.indexed_bytes):
+				if dt is not None:
+					entries.append((_epoch_micros(dt), offset))
+
+			entries.sort()
+
+		self.checksum = self._checksum()
+		return entries
+
+	def build(self):
+		'''
+		Indexes the whole file and saves the index.
+		'''
+		del self.epochs[:], self.offsets_array[:]
+
+		for epoch, offset in self._scan(0):
+			self.epochs.append(epoch)
+			self.offsets_array.append(offset)
+
+		self.save()
+
+	def update(self):
+		'''
+		Indexes the rows appended to the file since the index was built or last updated, and saves the 
+		index.  Returns the number of rows indexed, which includes a last line that was unfinished at the 
+		previous update and is indexed again (or every row, if the file changed and was indexed again).
+		'''
+		import heapq
+
+		size = os.path.getsize(self.path)
+
+		if size < self.indexed_bytes or self._checksum() != self.checksum:
+			self.build()
+			return len(self)
+
+		if size == self.indexed_bytes:
+			return 0
+
+		start = self.complete_bytes
+
+		if self.indexed_bytes > start:
+			# forget the unfinished line, which is indexed again with the rest.  What was written of it 
+			# is still in the file, so reading that again gives the epoch it was indexed under.
+			for offset, dt in scan_temporal_file(self.path, self.column, self.delimiter, start, self.indexed_bytes):
+				i = len(self)
+
+				if dt is not None:
+					epoch = _epoch_micros(dt)
+					i = bisect.bisect_left(self.epochs, epoch)
+
+					while i < len(self) and self.epochs[i] == epoch and self.offsets_array[i] != offset:
+						i += 1
+
+					if i < len(self) and (self.epochs[i] != epoch or self.offsets_array[i] != offset):
+						i = len(self)
+
+				if i == len(self):
+					# a value that parses differently now (such as a time of day relative to today)
+					try:
+						i = self.offsets_array.index(offset)
+					except ValueError:
+						continue
+
+				del self.epochs[i], self.offsets_array[i]
+
+		entries = self._scan(start)
+
+		if entries and len(self) and entries[0] < (self.epochs[-1], self.offsets_array[-1]):
+			# the new rows aren't all later than the indexed ones, so the two are merged
+			merged = list(heapq.merge(zip(self.epochs, self.offsets_array), entries))
+			self.epochs = _int64_array([epoch for epoch, offset in merged])
+			self.offsets_array = _int64_array([offset for epoch, offset in merged])
+		else:
+			for epoch, offset in entries:
+				self.epochs.append(epoch)
+				self.offsets_array.append(offset)
+
+		self.save()
+		return len(entries)
+
+	def save(self):
+		'''
+		Writes the index to its sidecar file.
+		'''
+		import struct
+
+		column = self.column
+
+		if column is None:
+			column = -1
+
+		temporary_path = self.index_path + '.tmp'
+		output = open(temporary_path, 'wb')
+
+		try:
+			output.write(struct.pack(self.HEADER, self.MAGIC, self.indexed_bytes, self.complete_bytes, 
+				len(self), self.checksum, column, self.delimiter))
+
+			for values in (self.epochs, self.offsets_array):
+				if sys.byteorder == 'big':
+					values = values[:]
+					values.byteswap()
+
+				values.tofile(output)
+		finally:
+			output.close()
+
+		if os.path.exists(self.index_path):
+			os.remove(self.index_path)
+
+		os.rename(temporary_path, self.index_path)
+
+	def load(self):
+		'''
+		Reads the index from its sidecar file, raising a ValueError if it isn't an index of this file.
+		'''
+		import struct
+
+		input_file = open(self.index_path, 'rb')
+
+		try:
+			header = input_file.read(struct.calcsize(self.HEADER))
+
+			if header[:len(self.MAGIC)] != self.MAGIC:
+				raise ValueError("'%s' isn't a temporal index" % (self.index_path,))
+
+			magic, self.indexed_bytes, self.complete_bytes, count, self.checksum, column, delimiter = \
+				struct.unpack(self.HEADER, header)
+
+			if column < 0:
+				column = None
+
+			delimiter = delimiter.rstrip('\0')
+
+			if column != self.column or delimiter != self.delimiter:
+				raise ValueError("'%s' indexes column %r delimited by %r" % (self.index_path, column, delimiter))
+
+			self.epochs = _int64_array()
+			self.offsets_array = _int64_array()
+			self.epochs.fromfile(input_file, count)
+			self.offsets_array.fromfile(input_file, count)
+		finally:
+			input_file.close()
+
+		if sys.byteorder == 'big':
+			self.epochs.byteswap()
+			self.offsets_array.byteswap()
+
+	def positions(self, start=None, end=None, inclusive=True):
+		'''
+		Returns the (first, last) positions in the index of the rows from start up to end, so that the 
+		rows are those at positions first through last - 1.  Either bound can be None.
+		'''
+		first, last = 0, len(self.epochs)
+
+		if start is not None:
+			first = bisect.bisect_left(self.epochs, _epoch_micros(parse_temporal(start, 'raise')))
+
+		if end is not None:
+			end = _epoch_micros(parse_temporal(end, 'raise'))
+
+			if inclusive:
+				last = bisect.bisect_right(self.epochs, end)
+			else:
+				last = bisect.bisect_left(self.epochs, end)
+
+		return first, max(first, last)
+
+	def count(self, start=None, end=None, inclusive=True):
+		'''
+		Returns the number of rows from start up to end.
+		'''
+		first, last = self.positions(start, end, inclusive)
+		return last - first
+
+	def offsets(self, start=None, end=None, inclusive=True):
+		'''
+		Returns a list of the byte offsets of the rows from start up to (and including, unless inclusive 
+		is False) end, in temporal order.
+		'''
+		first, last = self.positions(start, end, inclusive)
+		return self.offsets_array[first:last].tolist()
+
+	def period_offsets(self, date_part, period):
+		'''
+		Returns a list of the byte offsets of the rows within a period, given the same way as for in_period().
+		'''
+		predicate = in_period(date_part, period)
+		return self.offsets(predicate.start, predicate.end, inclusive=False)
+
+	def rows(self, offsets):
+		'''
+		Yields (offset, line) for each of the byte offsets, reading the lines from the file through a memory map.
+		'''
+		import mmap
+
+		input_file = open(self.path, 'rb')
+
+		try:
+			if os.fstat(input_file.fileno()).st_size == 0:
+				return
+
+			mm = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+		finally:
+			input_file.close()
+
+		try:
+			for offset in offsets:
+				line_end = mm.find('\n', offset)
+
+				if line_end == -1:
+					line_end = len(mm)
+
+				yield offset, mm[offset:line_end].rstrip('\r')
+		finally:
+			mm.close()
+
+# The packed column format: a 32 byte header (the magic, the number of values, the size of the null
+# bitmap and two reserved fields), the values as little-endian 64 bit microseconds since 1970-01-01,
+# and, if any value is null, a bitmap with a set bit for each valid value (the high bit of the first
+# byte is the first value).  Null values are stored as the smallest 64 bit integer, which numpy
+# reads as NaT.
+_COLUMN_MAGIC = 'DTTMCOL1'
+_COLUMN_HEADER = '<8sqqii'
+_COLUMN_NULL = -1 << 63
+
+def write_temporal_column(path, values):
+	'''
+	Writes a column of temporal values to a packed binary file, which read_temporal_column() maps back 
+	into memory without parsing anything.  Values are written as they are parsed, so the column doesn't
+	have to fit in memory.  Values that are None or can't be parsed are stored as nulls.  As with 
+	parse_temporal_many(), values with an offset keep their local time.
+
+	Usage:
+
+		write_temporal_column('dates.col', open('dates'))
+		write_temporal_column('dates.col', dts)
+
+	Parameters:
+
+		path: the file to write.
+		values: an iterable of temporal values, or a numpy datetime64 array.
+
+	Returns:
+
+		The number of values written.
+
+	'''
+	import struct
+
+	output = open(path, 'wb')
+
+	try:
+		output.write('\0' * struct.calcsize(_COLUMN_HEADER))
+
+		if getattr(values, 'dtype', None) is not None and values.dtype.kind == 'M':
+			_require_numpy()
+			valid = ~numpy.isnat(values)
+			values.astype('M8[us]').view(numpy.int64).astype('<i8').tofile(output)
+			count, nulls = len(values), len(values) - int(valid.sum())
+			bitmap = numpy.packbits(valid).tostring()
+		else:
+			count, nulls, bitmap = _write_column_values(output, values)
+
+		if nulls:
+			output.write(bitmap)
+		else:
+			bitmap = ''
+
+		output.seek(0)
+		output.write(struct.pack(_COLUMN_HEADER, _COLUMN_MAGIC, count, len(bitmap), 0, 0))
+	finally:
+		output.close()
+
+	return count
+
+def _write_column_values(output, values, block_size=65536):
+	'''
+	Writes temporal values to a packed column a block at a time, returning (count, nulls, bitmap).
+	'''
+	block = _int64_array()
+	bitmap = bytearray()
+	count = nulls = 0
+
+	for value in values:
+		micros = None
+
+		if isinstance(value, basestring):
+			# lines read from a file keep their line endings
+			value = value.rstrip('\r\n')
+
+		if value is not None:
+			try:
+				micros = _to_micros(parse_temporal(value, 'raise'))
+			except (ValueError, OverflowError, TypeError, AttributeError):
+				pass
+
+		if count % 8 == 0:
+			bitmap.append(0)
+
+		if micros is None:
+			block.append(_COLUMN_NULL)
+			nulls += 1
+		else:
+			block.append(micros)
+			bitmap[-1] |= 0x80 >> (count % 8)
+
+		count += 1
+
+		if len(block) >= block_size:
+			_write_little_endian(output, block)
+			block = _int64_array()
+
+	_write_little_endian(output, block)
+	return count, nulls, str(bitmap)
+
+def _write_little_endian(output, block):
+	if sys.byteorder == 'big':
+		block.byteswap()
+
+	block.tofile(output)
+
+def convert_temporal_file(input_path, output_path, column=None, delimiter='\t'):
+	'''
+	Parses the temporal values of a text file once and writes them to a packed column, reading the text 
+	through a memory map with scan_temporal_file().
+
+	Usage:
+
+		convert_temporal_file('dates', 'dates.col')
+		convert_temporal_file('events.csv', 'events.col', column=2, delimiter=',')
+
+	Returns:
+
+		The number of values written.
+
+	'''
+	return write_temporal_column(output_path, 
+		(dt for offset, dt in scan_temporal_file(input_path, column, delimiter)))
+
+def read_temporal_column(path):
+	'''
+	Maps a packed column written by write_temporal_column() into memory.  With numpy, the values are a
+	datetime64[us] array backed directly by the file (nothing is copied or parsed), which can be given to 
+	any of the batch functions.  Without numpy (as under Jython) the values are an array of 64 bit 
+	integers, microseconds since 1970-01-01, read in one piece.
+
+	Usage:
+
+		dts, valid = read_temporal_column('dates.col')
+		months, valid = date_part_many('month', dts)
+
+	Returns:
+
+		A tuple of the values and a mask of the valid (not null) values, as numpy arrays or, without numpy, 
+		as an array and a list.
+
+	'''
+	import mmap
+	import struct
+
+	header_size = struct.calcsize(_COLUMN_HEADER)
+	input_file = open(path, 'rb')
+
+	try:
+		header = input_file.read(header_size)
+
+		if len(header) != header_size or header[:len(_COLUMN_MAGIC)] != _COLUMN_MAGIC:
+			raise ValueError("'%s' isn't a packed temporal column" % (path,))
+
+		magic, count, bitmap_size, reserved, reserved = struct.unpack(_COLUMN_HEADER, header)
+
+		try:
+			_require_numpy()
+		except ImportError:
+			pass
+
+		if numpy is not None:
+			if count == 0:
+				return numpy.zeros(0, dtype='M8[us]'), numpy.zeros(0, dtype=bool)
+
+			micros = numpy.memmap(input_file, dtype='<i8', mode='r', offset=header_size, shape=(count,))
+
+			if sys.byteorder == 'little':
+				dts = micros.view('M8[us]')
+			else:
+				dts = micros.astype(numpy.int64).view('M8[us]')
+
+			if bitmap_size:
+				bitmap = numpy.memmap(input_file, dtype=numpy.uint8, mode='r', 
+					offset=header_size + count * 8, shape=(bitmap_size,))
+				valid = numpy.unpackbits(bitmap)[:count].astype(bool)
+			else:
+				valid = numpy.ones(count, dtype=bool)
+
+			return dts, valid
+
+		micros = _int64_array()
+
+		if count == 0:
+			return micros, []
+
+		mm = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+	finally:
+		input_file.close()
+
+	try:
+		micros.fromstring(mm[header_size:header_size + count * 8])
+
+		if sys.byteorder == 'big':
+			micros.byteswap()
+
+		if bitmap_size:
+			bitmap = bytearray(mm[header_size + count * 8:header_size + count * 8 + bitmap_size])
+			valid = [bool(bitmap[i >> 3] & (0x80 >> (i & 7))) for i in xrange(count)]
+		else:
+			valid = [True] * count
+	finally:
+		mm.close()
+
+	return micros, valid
+
+# expressions compiled by this process for process_file(), keyed by their text
+_compiled_specs = {}
+
+def _file_chunks(path, chunk_size):
+	'''
+	Splits a file into (start, end) byte ranges of about chunk_size bytes, each starting at the beginning of a line.
+	'''
+	size = os.path.getsize(path)
+	chunks = []
+	start = 0
+
+	input_file = open(path, 'rb')
+
+	try:
+		while start < size:
+			end = start + chunk_size
+
+			if end >= size:
+				end = size
+			else:
+				# move the boundary to the start of the next line
+				input_file.seek(end - 1)
+				input_file.readline()
+				end = input_file.tell()
+
+			chunks.append((start, end))
+			start = end
+	finally:
+		input_file.close()
+
+	return chunks
+
+def _init_worker(cache_size):
+	if cache_size is not None:
+		parse_cache_resize(cache_size)
+
+def _process_chunk(task):
+	'''
+	Runs the expressions over one byte range of a file, for process_file().  The result is either the
+	output text or, when the task has a part file, the number of lines written to it.
+	'''
+	path, start, end, specs, column, delimiter, replace, errors, part_path = task
+
+	expressions = []
+
+	for spec in specs:
+		if spec not in _compiled_specs:
+			_compiled_specs[spec] = TemporalExpression.from_spec(spec).compile()
+		expressions.append(_compiled_specs[spec])
+
+	input_file = open(path, 'rb')
+
+	try:
+		input_file.seek(start)
+		data = input_file.read(end - start)
+	finally:
+		input_file.close()
+
+	# the same lines that reading the file line by line gives, which only end at '\n' (splitlines() 
+	# would also end them at '\r', '\x0c' and friends)
+	lines = data.split('\n')
+	last = lines.pop()
+	lines = [line + '\n' for line in lines]
+
+	if last:
+		lines.append(last)
+
+	output_lines = _transform_lines(lines, expressions, column, delimiter, replace, errors)
+
+	if part_path is None:
+		return ''.join(output_lines)
+
+	part_file = open(part_path, 'wb')
+
+	try:
+		# records dropped by errors='skip' aren't written, so they aren't counted
+		return _write_buffered(part_file, output_lines)
+	finally:
+		part_file.close()
+
+def process_file(path, specs, output=None, column=0, delimiter='\t', replace=False, errors='blank',
+		workers=None, chunk_size=32 << 20, part_dir=None, cache_size=None):
+	'''
+	Applies temporal expressions to one column of a large delimited file using several processes.  The 
+	file is split into line-aligned byte ranges of about chunk_size bytes, and each range is handled by a 
+	worker process with its own parse cache.
+
+	Results are either written to output in the same order as the input, or, if part_dir is given, each 
+	range is written to its own part file (part-00000, part-00001, ...) in that directory as soon as it 
+	is done, like the output of a Hadoop job.
+
+	Usage:
+
+		process_file('dates', ['date_trunc:day', 'date_name:dow'], output=open('days', 'wb'))
+		process_file('dates', ['epoch'], part_dir='epochs', workers=8, chunk_size=64 << 20)
+
+	Parameters:
+
+		path: the file to read.
+		specs: a list of expressions in the form used by TemporalExpression.from_spec().
+		output: a file to write the results to in order (defaults to stdout), when part_dir isn't given.
+		column, delimiter, replace, errors: as for the command line (see main()).
+		workers: the number of processes to use, defaults to the number of cores.
+		chunk_size: the approximate size in bytes of each range.
+		part_dir: a directory to write part files to, instead of writing to output.
+		cache_size: the size of each worker's parse cache, defaults to PARSE_CACHE_SIZE.
+
+	Returns:
+
+		The number of ranges that the file was split into.
+
+	'''
+	import multiprocessing
+
+	for spec in specs:
+		# check the expressions before starting any workers
+		TemporalExpression.from_spec(spec)
+
+	if workers is None:
+		workers = multiprocessing.cpu_count()
+
+	if output is None and part_dir is None:
+		output = sys.stdout
+
+	if part_dir is not None and not os.path.isdir(part_dir):
+		os.makedirs(part_dir)
+
+	chunks = _file_chunks(path, chunk_size)
+	tasks = []
+
+	for i, (start, end) in enumerate(chunks):
+		part_path = None
+
+		if part_dir is not None:
+			part_path = os.path.join(part_dir, 'part-%05d' % i)
+
+		tasks.append((path, start, end, tuple(specs), column, delimiter, replace, errors, part_path))
+
+	if workers <= 1 or len(tasks) <= 1:
+		_init_worker(cache_size)
+		results = (_process_chunk(task) for task in tasks)
+		pool = None
+	else:
+		pool = multiprocessing.Pool(workers, _init_worker, (cache_size,))
+
+		if part_dir is None:
+			results = pool.imap(_process_chunk, tasks)
+		else:
+			results = pool.imap_unordered(_process_chunk, tasks)
+
+	try:
+		for result in results:
+			if part_dir is None:
+				output.write(result)
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+
+	return len(tasks)
+
+def main(argv=None):
+	'''
+	Runs dttm from the command line, reading delimited records from files (or stdin), applying temporal 
+	expressions to one column, and writing the records with the results to stdout.  This lets the same 
+	functions run as a CPython Hadoop Streaming mapper instead of as Jython UDFs.
+
+	Usage:
+
+		python -m dttm -e date_trunc:day -e date_name:dow dates
+		python dttm.py -c 2 -d , -e epoch --replace < events.csv
+		python dttm.py -w 8 --part-dir normalized -e parse big_dates
+
+		hadoop jar hadoop-streaming.jar -file dttm.py -input dates -output days \\
+			-mapper 'python dttm.py -e date_trunc:day'
+
+	See TemporalExpression.from_spec() for how expressions are written.
+
+	'''
+	import optparse
+
+	option_parser = optparse.OptionParser(usage='%prog [options] [file ...]', 
+		description='Apply dttm operations to a column of delimited records.')
+	option_parser.add_option('-e', '--expr', action='append', dest='expressions', default=[],
+		help="an expression to apply, such as 'date_trunc:month' (may be repeated, defaults to 'parse')")
+	option_parser.add_option('-c', '--column', type='int', default=0, 
+		help='the zero based column holding the temporal value (default 0)')
+	option_parser.add_option('-d', '--delimiter', default='\t', 
+		help='the field delimiter (default tab)')
+	option_parser.add_option('-r', '--replace', action='store_true', default=False,
+		help='replace the column with the results instead of appending them')
+	option_parser.add_option('--errors', choices=['blank', 'skip', 'fail'], default='blank',
+		help="what to do with values that can't be parsed: blank, skip or fail (default blank)")
+	option_parser.add_option('--buffer-lines', type='int', default=4096,
+		help='the number of output lines to buffer between writes (default 4096)')
+	option_parser.add_option('-w', '--workers', type='int', default=1,
+		help='the number of processes to use for files (default 1, 0 for one per core)')
+	option_parser.add_option('--chunk-size', type='int', default=32 << 20,
+		help='the size in bytes of the ranges files are split into for the workers (default 32MB)')
+	option_parser.add_option('--part-dir', 
+		help='write one part file per range into this directory instead of writing to stdout')
+
+	options, paths = option_parser.parse_args(argv)
+
+	try:
+		expressions = [TemporalExpression.from_spec(spec).compile() for spec in (options.expressions or ['parse'])]
+	except ValueError, error:
+		option_parser.error(str(error))
+
+	if options.workers != 1 or options.part_dir:
+		if not paths:
+			option_parser.error('--workers and --part-dir need input files, not stdin')
+
+		for i, path in enumerate(paths):
+			part_dir = options.part_dir
+
+			if part_dir and len(paths) > 1:
+				part_dir = os.path.join(part_dir, str(i))
+
+			process_file(path, options.expressions or ['parse'], sys.stdout, options.column, options.delimiter, 
+				options.replace, options.errors, options.workers or None, options.chunk_size, part_dir)
+
+		sys.stdout.flush()
+		return 0
+
+	if paths:
+		inputs = [open(path, 'rb', 1 << 16) for path in paths]
+	else:
+		inputs = [sys.stdin]
+
+	for input_file in inputs:
+		lines = _transform_lines(input_file, expressions, options.column, options.delimiter, 
+			options.replace, options.errors)
+		_write_buffered(sys.stdout, lines, options.buffer_lines)
+
+		if input_file is not sys.stdin:
+			input_file.close()
+
+	sys.stdout.flush()
+	return 0
+
+if os.environ.get('DTTM_METRICS'):
+	import atexit
+	enable_metrics(pig_counters=(os.environ['DTTM_METRICS'] == 'pig'))
+
+	if os.environ['DTTM_METRICS'] == 'pig':
+		# the calls made since the last periodic report would otherwise never reach the counters
+		atexit.register(metrics_to_pig_counters)
+
+	if os.environ.get('DTTM_METRICS_FILE'):
+		atexit.register(metrics_dump, os.environ['DTTM_METRICS_FILE'])
+
+if _quarantine.path is not None:
+	import atexit
+	atexit.register(_quarantine.close)
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,277 @@
+'''
+Equivalence checks for dttm: the fast paths against the slow ones they stand in for (the scanner against
+dateutil, the batch functions against the scalar functions, the time zone tables against dateutil).
+
+Run with:
+
+	python -m unittest test_dttm
+
+'''
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from dateutil import parser, tz
+
+import dttm
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+def _random_datetimes(count, seed=2013):
+	'''
+	Returns a list of random datetimes between 1900 and 2100, with and without fractional seconds.
+	'''
+	generator = random.Random(seed)
+	start = datetime(1900, 1, 1)
+	result = []
+
+	for i in xrange(count):
+		dt = start + timedelta(days=generator.randint(0, 73000), seconds=generator.randint(0, 86399))
+
+		if i % 3 == 0:
+			dt = dt.replace(microsecond=generator.randint(0, 999999))
+
+		result.append(dt)
+
+	return result
+
+class FastPathTest(unittest.TestCase):
+
+	def setUp(self):
+		dttm.parse_cache_clear()
+
+	def test_iso_matches_dateutil(self):
+		for dt in _random_datetimes(500):
+			for text in (str(dt), dt.isoformat(), dt.strftime('%Y-%m-%d %H:%M'), dt.strftime('%Y-%m-%d'),
+					dt.isoformat() + '+05:30', dt.isoformat() + '-03:00'):
+				scanned = dttm._scan_temporal(text)
+				self.assertNotEqual(scanned, None, text)
+				self.assertEqual(scanned, parser.parse(text, fuzzy=True), text)
+				self.assertEqual(scanned.utcoffset(), parser.parse(text, fuzzy=True).utcoffset(), text)
+
+	def test_slash_matches_dateutil(self):
+		for dt in _random_datetimes(500):
+			us = '%d/%d/%04d %02d:%02d:%02d' % (dt.month, dt.day, dt.year, dt.hour, dt.minute, dt.second)
+			ymd = '%04d/%02d/%02d' % (dt.year, dt.month, dt.day)
+
+			for text in (us, ymd):
+				self.assertEqual(dttm._scan_temporal(text), parser.parse(text, fuzzy=True), text)
+
+			if dt.day > 12:
+				eu = '%d/%d/%04d' % (dt.day, dt.month, dt.year)
+				self.assertEqual(dttm._scan_temporal(eu), parser.parse(eu, fuzzy=True), eu)
+
+	def test_irregular_values_are_left_to_dateutil(self):
+		for text in ('1999-12-31T23:59:59Z', '1999-12-31 23:59:59+00:00', '12/31/99', 'Dec 31 1999',
+				'2013-02-30', 'garbage'):
+			self.assertEqual(dttm._scan_temporal(text), None, text)
+
+	def test_format_plan_matches_strptime(self):
+		for input_format in ('%Y-%m-%d %H:%M:%S.%f', '%d/%m/%Y %H:%M', '%H:%M:%S', '%Y%m%d%H%M%S'):
+			plan = dttm.TemporalFormat(input_format)
+
+			for dt in _random_datetimes(200):
+				text = dt.strftime(input_format)
+				self.assertEqual(plan.match(text), datetime.strptime(text, input_format), (input_format, text))
+
+		# two digit years are placed in a century the way dateutil does it, rather than the way strptime does
+		plan = dttm.TemporalFormat('%m/%d/%y')
+
+		for dt in _random_datetimes(200):
+			text = dt.strftime('%m/%d/%y')
+			self.assertEqual(plan.match(text), parser.parse(text), text)
+
+		self.assertEqual(dttm.TemporalFormat('%d/%m/%Y').match('31/02/1999'), None)
+
+	def test_parse_temporal_matches_dateutil(self):
+		for text in ('2013-02-24 18:15:44', '2013-02-24T18:15:44.5', '12/31/1999 23:59', 'Dec 31 1999',
+				'Today is 25 of September of 2003, exactly at 10:49:41 with timezone -03:00.'):
+			# the second time comes from the cache
+			for i in range(2):
+				self.assertEqual(dttm.parse_temporal(text), parser.parse(text, fuzzy=True), text)
+
+class PredicateTest(unittest.TestCase):
+
+	def test_fast_path_matches_slow_path(self):
+		within = dttm.in_period('day', '2013-02-24')
+
+		for text in ('2013-02-24', '2013-02-24 00:00:00', '2013-02-24T23:59:59.999999', '2013-02-24 00:00:00\n',
+				' 2013-02-24 12:00', '2013-02-24\r\n', 'Feb 24 2013'):
+			self.assertEqual(within(text), True, repr(text))
+
+		for text in ('2013-02-23 23:59:59.999999', '2013-02-25', '2013-02-25 00:00:00\n', 'Feb 25 2013'):
+			self.assertEqual(within(text), False, repr(text))
+
+class BagTest(unittest.TestCase):
+
+	bag = [('2013-02-24 18:15:44',), ('garbage',), None, (), ('1999-12-31 23:59:59',), ('Feb 30 2013',)]
+
+	def tearDown(self):
+		dttm.set_error_policy('raise')
+		dttm.error_quarantine().clear()
+
+	def test_bad_values_are_skipped_under_every_policy(self):
+		for policy in ('raise', 'null', 'quarantine'):
+			dttm.set_error_policy(policy)
+
+			self.assertEqual(dttm.bag_parse(self.bag), [('2013-02-24 18:15:44',), (None,), (None,), (None,),
+				('1999-12-31 23:59:59',), (None,)])
+			self.assertEqual(dttm.bag_date_parts('yy,mm', self.bag)[:2], [('2013', '2'), (None, None)])
+			self.assertEqual(dttm.bag_min(self.bag), '1999-12-31 23:59:59')
+
+	def test_bad_values_are_quarantined(self):
+		dttm.set_error_policy('quarantine')
+		dttm.error_quarantine().clear()
+
+		for function in (dttm.bag_parse, dttm.bag_min, lambda bag: dttm.bag_date_parts('dd', bag)):
+			function(self.bag)
+
+		rows = [(row, value) for row, value, error in dttm.error_quarantine().records]
+		self.assertEqual(rows, [(1, 'garbage'), (5, 'Feb 30 2013')] * 3)
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class BatchTest(unittest.TestCase):
+
+	def setUp(self):
+		self.datetimes = _random_datetimes(2000)
+		self.values = [str(dt) for dt in self.datetimes]
+		self.dts, self.valid = dttm.parse_temporal_many(self.values)
+
+	def test_parse_matches_scalar(self):
+		values = self.values[:200] + ['12/31/1999 23:59', 'Dec 31 1999', '2013-02-30', 'garbage', None, '']
+		dts, valid = dttm.parse_temporal_many(values)
+
+		for value, dt, ok in zip(values, dts, valid):
+			expected = dttm.parse_temporal(value, 'null')
+			self.assertEqual(bool(ok), expected is not None, value)
+
+			if ok:
+				self.assertEqual(dt, numpy.datetime64(expected, 'us'), value)
+
+	def test_parts_match_scalar(self):
+		for date_part in ('year', 'quarter', 'month', 'day_of_year', 'day', 'week', 'ISO_WEEK', 'day_of_week',
+				'hour', 'minute', 'second', 'microsecond'):
+			parts, valid = dttm.date_part_many(date_part, self.dts)
+
+			for value, part in zip(self.values, parts):
+				self.assertEqual(int(part), int(dttm.date_name(date_part, value)), (date_part, value))
+
+	def test_every_numeric_alias_matches_scalar(self):
+		for date_part, part in sorted(dttm._DATE_PARTS.items()):
+			if part in ('day_name', 'tz_offset'):
+				continue
+
+			parts, valid = dttm.date_part_many(date_part, self.dts[:300])
+
+			for value, result in zip(self.values, parts):
+				self.assertEqual(int(result), int(dttm.date_name(date_part, value)), (date_part, value))
+
+	def test_calendar_operations_match_scalar(self):
+		for date_part in ('year', 'quarter', 'month', 'week', 'day', 'hour', 'minute', 'second'):
+			added, valid = dttm.date_add_many(date_part, 7, self.dts)
+			truncated, valid = dttm.date_trunc_many(date_part, self.dts)
+
+			for i, value in enumerate(self.values[:300]):
+				self.assertEqual(added[i], numpy.datetime64(dttm.parse_temporal(dttm.date_add(date_part, 7, value)), 'us'))
+				self.assertEqual(truncated[i], numpy.datetime64(dttm.parse_temporal(dttm.date_trunc(date_part, value)), 'us'))
+
+		for date_part in ('year', 'quarter', 'month', 'week', 'day', 'hour', 'minute'):
+			ends, valid = dttm.date_end_of_many(date_part, self.dts)
+
+			for i, value in enumerate(self.values[:300]):
+				self.assertEqual(ends[i], numpy.datetime64(dttm.parse_temporal(dttm.date_end_of(date_part, value)), 'us'))
+
+	def test_diff_matches_scalar(self):
+		starts, ends = self.values[:500], self.values[500:1000]
+
+		for date_part in ('year', 'quarter', 'month', 'week', 'day', 'hour', 'minute', 'second'):
+			differences, valid = dttm.date_diff_many(date_part, starts, ends)
+
+			for start, end, difference in zip(starts, ends, differences):
+				self.assertEqual(int(difference), int(dttm.date_diff(date_part, start, end)), (date_part, start, end))
+
+class ProcessFileTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, 'dates')
+
+		dates = open(self.path, 'wb')
+		dates.write('2013-01-01\ngarbage\n2013-01-02\n')
+		dates.close()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_part_files_count_the_lines_written(self):
+		dttm._init_worker(None)
+		part_path = os.path.join(self.directory, 'part-00000')
+
+		for errors, count in (('skip', 2), ('blank', 3)):
+			task = (self.path, 0, os.path.getsize(self.path), ('epoch',), 0, '\t', False, errors, part_path)
+			self.assertEqual(dttm._process_chunk(task), count, errors)
+			self.assertEqual(len(open(part_path).readlines()), count, errors)
+
+class TimezoneTableTest(unittest.TestCase):
+
+	zones = ('America/New_York', 'Europe/Paris', 'Asia/Kolkata', 'Australia/Lord_Howe')
+
+	def test_to_timezone_matches_dateutil(self):
+		for zone in self.zones:
+			tzinfo = tz.gettz(zone)
+			dt = datetime(1900, 1, 1)
+
+			while dt < datetime(2101, 1, 1):
+				local = dttm.to_timezone(dt, zone)
+				expected = dt.replace(tzinfo=tz.tzutc()).astimezone(tzinfo)
+
+				self.assertEqual(local.replace(tzinfo=None), expected.replace(tzinfo=None), (zone, dt))
+				self.assertEqual(local.utcoffset(), expected.utcoffset(), (zone, dt))
+				self.assertEqual(local.tzname(), expected.tzname(), (zone, dt))
+				dt += timedelta(hours=97)
+
+	def test_from_timezone_reverses_to_timezone(self):
+		for zone in self.zones:
+			for dt in _random_datetimes(500):
+				local = dttm.to_timezone(dt, zone).replace(tzinfo=None)
+				utc = dttm.from_timezone(local, zone).replace(tzinfo=None)
+
+				# a wall clock time that happens twice is taken as the first of the two
+				self.assertTrue(utc <= dt, (zone, dt, local, utc))
+
+	@unittest.skipIf(numpy is None, 'numpy is not installed')
+	def test_many_matches_scalar(self):
+		values = [str(dt) for dt in _random_datetimes(1000)]
+
+		for zone in self.zones:
+			local, valid = dttm.to_timezone_many(values, zone)
+			utc, valid = dttm.from_timezone_many(values, zone)
+
+			for value, to_local, to_utc in zip(values, local, utc):
+				self.assertEqual(to_local, numpy.datetime64(dttm.to_timezone(value, zone).replace(tzinfo=None), 'us'))
+				self.assertEqual(to_utc, numpy.datetime64(dttm.from_timezone(value, zone).replace(tzinfo=None), 'us'))
+
+	@unittest.skipIf(numpy is None, 'numpy is not installed')
+	def test_many_with_bad_rows(self):
+		values = ['2013-02-24 18:15:44', 'garbage', '1999-12-31 23:59:59', None, '0001-01-01 12:00:00']
+		dts, valid = dttm.parse_temporal_many(values)
+
+		for zone in self.zones:
+			for converted in (dttm.to_timezone_many(dts, zone), dttm.to_timezone_many(values, zone),
+					dttm.from_timezone_many(dts, zone), dttm.from_timezone_many(values, zone)):
+				local, local_valid = converted
+				self.assertEqual(list(local_valid), [True, False, True, False, True])
+				self.assertTrue(numpy.isnat(local[1]) and numpy.isnat(local[3]))
+
+			local, local_valid = dttm.to_timezone_many(dts, zone)
+			self.assertEqual(local[0], numpy.datetime64(dttm.to_timezone(values[0], zone).replace(tzinfo=None), 'us'))
+
+if __name__ == '__main__':
+	unittest.main()